@@ -1,6 +1,15 @@
 from django.contrib import admin
-from .models import AvailabilitySlot, Booking
+from .models import (
+    ArchivedBooking, AvailabilitySlot, Booking, BookingReminder, CancelledBooking, DayAvailability, EmailOutbox,
+    WaitlistEntry,
+)
 
 # Register your models here.
 admin.site.register(AvailabilitySlot)
-admin.site.register(Booking)
\ No newline at end of file
+admin.site.register(Booking)
+admin.site.register(ArchivedBooking)
+admin.site.register(BookingReminder)
+admin.site.register(CancelledBooking)
+admin.site.register(DayAvailability)
+admin.site.register(EmailOutbox)
+admin.site.register(WaitlistEntry)
\ No newline at end of file
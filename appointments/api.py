@@ -0,0 +1,192 @@
+"""
+JSON API for mobile clients.
+
+Read endpoints send strong ETags and answer a matching ``If-None-Match``
+with 304. The free-slot ETag is built from the doctor's availability
+version, so an unchanged poll is served from the cache without touching
+the database.
+"""
+import hashlib
+import json
+from datetime import datetime, time, timedelta
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_POST
+
+from . import availability, live, search
+from .booking import SlotUnavailable, claim_slot, release_booking
+from .models import AvailabilitySlot, Booking
+
+
+def api_login_required(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            user = await request.auser()
+            if not user.is_authenticated:
+                return JsonResponse({"error": "Authentication required."}, status=401)
+            request.user = user
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Authentication required."}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def conditional_json(request, data, etag):
+    """Return a 304 if the client already has ``etag``, else the JSON body."""
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    response = JsonResponse(data)
+    response["ETag"] = etag
+    return response
+
+
+@api_login_required
+async def doctors(request):
+    rows = [
+        r async for r in
+        User.objects.filter(profile__role="doctor")
+        .order_by("username")
+        .values("id", "username", "profile__specialization")
+    ]
+    data = {
+        "results": [
+            {"id": r["id"], "username": r["username"], "specialization": r["profile__specialization"]}
+            for r in rows
+        ]
+    }
+    digest = hashlib.md5(json.dumps(data, sort_keys=True).encode(), usedforsecurity=False).hexdigest()
+    return conditional_json(request, data, f'"doctors-{digest}"')
+
+
+@api_login_required
+async def doctor_slots(request, doctor_id):
+    """
+    Free slots for ``doctor_id`` on ``?date=YYYY-MM-DD``.
+
+    An unknown doctor simply has no slots; checking would cost a query on
+    every poll.
+    """
+    try:
+        day = datetime.strptime(request.GET.get("date", ""), "%Y-%m-%d").date()
+    except ValueError:
+        return JsonResponse({"error": "Invalid date selected."}, status=400)
+
+    version, slots = await availability.aversioned_free_slots(doctor_id, day)
+    # Slots drop off the front of the cached list as they pass, so the
+    # version plus the remaining count identifies the body exactly.
+    etag = f'"slots-{doctor_id}-{day.isoformat()}-{version}-{len(slots)}"'
+
+    return conditional_json(request, {"doctor": doctor_id, "date": day, "results": slots}, etag)
+
+
+@api_login_required
+async def search_slots(request):
+    """
+    Earliest free slots across doctors.
+
+    ``?specialization=`` (optional), ``from``/``to`` dates (``to`` defaults
+    to ``from``), ``after``/``before`` local times and ``limit``.
+    """
+    params = request.GET
+    try:
+        first_day = datetime.strptime(params.get("from", ""), "%Y-%m-%d").date()
+        last_day = datetime.strptime(params.get("to") or params["from"], "%Y-%m-%d").date()
+        after = time.fromisoformat(params.get("after") or "00:00")
+        before = time.fromisoformat(params["before"]) if params.get("before") else None
+        limit = int(params.get("limit") or search.SEARCH_LIMIT)
+    except (KeyError, ValueError):
+        return JsonResponse({"error": "Invalid search parameters."}, status=400)
+
+    if not first_day <= last_day < first_day + timedelta(days=search.MAX_SEARCH_DAYS):
+        return JsonResponse({"error": f"Search at most {search.MAX_SEARCH_DAYS} days."}, status=400)
+    if before is not None and before <= after:
+        return JsonResponse({"error": "Invalid time window."}, status=400)
+
+    results = await search.aearliest_free_slots(
+        first_day, last_day, after, before,
+        specialization=params.get("specialization", "").strip(),
+        limit=max(1, min(limit, search.MAX_SEARCH_LIMIT)),
+    )
+    return JsonResponse({"results": results})
+
+
+@api_login_required
+async def slot_events(request, doctor_id):
+    """
+    Server-Sent Events for ``doctor_id`` on ``?date=YYYY-MM-DD``: a
+    ``snapshot`` of the free slots, then ``booked`` and ``freed`` events.
+
+    Streams stay open for minutes and only work under ASGI. A WSGI request
+    gets a 204, which tells ``EventSource`` not to reconnect. The first
+    snapshot is read here, before the response starts, and the stream then
+    releases the request's thread and database connection.
+    """
+    if not live.can_stream(request):
+        return HttpResponse(status=204)
+
+    try:
+        day = datetime.strptime(request.GET.get("date", ""), "%Y-%m-%d").date()
+    except ValueError:
+        return JsonResponse({"error": "Invalid date selected."}, status=400)
+
+    if live.connection_count() >= getattr(settings, "LIVE_EVENTS_MAX_CONNECTIONS", 10000):
+        response = JsonResponse({"error": "Too many live connections."}, status=503)
+        response["Retry-After"] = "30"
+        return response
+
+    first = await live.read_snapshot(doctor_id, day)
+    response = StreamingHttpResponse(live.stream(doctor_id, day, first), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@require_POST
+@api_login_required
+def book(request, slot_id):
+    if request.user.profile.role != "patient":
+        return JsonResponse({"error": "Only patients can book appointments."}, status=403)
+
+    try:
+        booking = claim_slot(slot_id, request.user)
+    except AvailabilitySlot.DoesNotExist:
+        return JsonResponse({"error": "Slot not found."}, status=404)
+    except SlotUnavailable:
+        return JsonResponse({"error": "This slot has already been booked."}, status=409)
+
+    return JsonResponse({
+        "id": booking.id,
+        "slot": booking.slot_id,
+        "start": booking.slot.start,
+        "end": booking.slot.end,
+    }, status=201)
+
+
+@require_POST
+@api_login_required
+def cancel(request, booking_id):
+    try:
+        booking = Booking.objects.select_related("slot__doctor", "patient").get(pk=booking_id)
+    except Booking.DoesNotExist:
+        return JsonResponse({"error": "Booking not found."}, status=404)
+
+    if request.user != booking.patient:
+        return JsonResponse({"error": "You cannot cancel this booking."}, status=403)
+
+    release_booking(booking)
+    return JsonResponse({"id": booking_id, "cancelled": True})
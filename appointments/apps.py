@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class AppointmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appointments'
+
+    def ready(self):
+        import appointments.signals
+        import hms.sqlite
+        from hms import metrics
+        # Hook connections before any are opened, not at the first request:
+        # a connection another thread opened earlier would go uncounted.
+        metrics.install()
@@ -0,0 +1,151 @@
+"""
+Cached free-slot lists per (doctor, day).
+
+Entries are keyed by a per-doctor version number which is bumped whenever
+that doctor's slots or bookings change, so stale lists are never read and
+simply expire from the cache.
+"""
+import threading
+
+from django.db import transaction
+from django.utils.timezone import now
+
+from hms import metrics
+
+from .models import AvailabilitySlot
+from .schedule import day_bounds
+from .versioning import CACHE_TIMEOUT, aread_version, bump, get_cache, read_version
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+    if name != "invalidations":
+        metrics.incr(f"cache_{name}")
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def _version_key(doctor_id):
+    return f"avail:v:{doctor_id}"
+
+
+ROSTER_VERSION_KEY = "avail:v:roster"
+
+
+def _bump(key):
+    bump(key)
+    _count("invalidations")
+
+
+def get_version(doctor_id):
+    return read_version(_version_key(doctor_id))
+
+
+async def aget_version(doctor_id):
+    return await aread_version(_version_key(doctor_id))
+
+
+def bump_version(doctor_id):
+    _bump(_version_key(doctor_id))
+
+
+def invalidate_on_commit(doctor_id):
+    transaction.on_commit(lambda: bump_version(doctor_id))
+
+
+def get_roster_version():
+    """Version of the list of doctors; bumped when any doctor profile changes."""
+    return read_version(ROSTER_VERSION_KEY)
+
+
+async def aget_roster_version():
+    return await aread_version(ROSTER_VERSION_KEY)
+
+
+def bump_roster_version():
+    _bump(ROSTER_VERSION_KEY)
+
+
+def invalidate_roster_on_commit():
+    transaction.on_commit(bump_roster_version)
+
+
+def free_slots(doctor_id, day):
+    """
+    Return the doctor's free, future slots on ``day`` as a list of
+    ``{"id", "start", "end"}`` dicts.
+    """
+    return versioned_free_slots(doctor_id, day)[1]
+
+
+def versioned_free_slots(doctor_id, day):
+    """Like ``free_slots`` but also return the version the list was read under."""
+    version = get_version(doctor_id)
+    key = _slots_key(doctor_id, day, version)
+    cache = get_cache()
+    rows = cache.get(key)
+
+    if rows is None:
+        _count("misses")
+        rows = list(_slots_query(doctor_id, day))
+        cache.set(key, rows, CACHE_TIMEOUT)
+    else:
+        _count("hits")
+
+    return version, _upcoming(rows)
+
+
+async def afree_slots(doctor_id, day):
+    return (await aversioned_free_slots(doctor_id, day))[1]
+
+
+async def aversioned_free_slots(doctor_id, day):
+    cache = get_cache()
+    version = await aread_version(_version_key(doctor_id))
+    key = _slots_key(doctor_id, day, version)
+    rows = await cache.aget(key)
+
+    if rows is None:
+        _count("misses")
+        rows = [row async for row in _slots_query(doctor_id, day)]
+        await cache.aset(key, rows, CACHE_TIMEOUT)
+    else:
+        _count("hits")
+
+    return version, _upcoming(rows)
+
+
+def _slots_key(doctor_id, day, version):
+    return f"avail:{doctor_id}:{day.isoformat()}:{version}"
+
+
+def _slots_query(doctor_id, day):
+    day_start, day_end = day_bounds(day)
+    return AvailabilitySlot.objects.filter(
+        doctor_id=doctor_id,
+        booked=False,
+        start__gte=day_start,
+        start__lt=day_end,
+    ).order_by("start").values_list("id", "start", "end")
+
+
+def _upcoming(rows):
+    current_time = now()
+    return [
+        {"id": pk, "start": start, "end": end}
+        for pk, start, end in rows
+        if start > current_time
+    ]
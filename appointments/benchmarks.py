@@ -0,0 +1,102 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Seeding writes straight through ``bulk_create`` (skipping the per-user
+profile signal) so large datasets can be built quickly inside a transaction
+that the command rolls back afterwards.
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.utils.timezone import localdate, make_aware
+
+from users.models import Profile
+
+from .models import AvailabilitySlot, Booking
+
+
+def seed(doctors, slots_per_doctor, patients=0, booked_every=0, prefix="bench", slot_minutes=30,
+         specializations=("general",)):
+    """
+    Create ``doctors`` doctors with ``slots_per_doctor`` consecutive slots
+    each, starting tomorrow, plus ``patients`` patients. Every
+    ``booked_every``-th slot is booked by a patient (round robin).
+
+    Returns ``(doctor_users, patient_users)``.
+    """
+    password = make_password(None)
+
+    def create_users(kind, count, role):
+        users = User.objects.bulk_create([
+            User(username=f"{prefix}_{kind}_{i}", email=f"{prefix}_{kind}_{i}@example.com", password=password)
+            for i in range(count)
+        ])
+        if not users or users[0].pk is None:
+            users = list(User.objects.filter(username__startswith=f"{prefix}_{kind}_").order_by("pk"))
+        Profile.objects.bulk_create([
+            Profile(
+                user=u,
+                role=role,
+                specialization=specializations[i % len(specializations)] if role == "doctor" else None,
+            )
+            for i, u in enumerate(users)
+        ])
+        return users
+
+    doctor_users = create_users("doctor", doctors, "doctor")
+    patient_users = create_users("patient", patients, "patient")
+
+    first = make_aware(datetime.combine(localdate() + timedelta(days=1), datetime.min.time()))
+    step = timedelta(minutes=slot_minutes)
+
+    for doctor in doctor_users:
+        slots = [
+            AvailabilitySlot(
+                doctor=doctor,
+                start=first + i * step,
+                end=first + (i + 1) * step,
+                booked=bool(patient_users and booked_every and i % booked_every == 0),
+            )
+            for i in range(slots_per_doctor)
+        ]
+        AvailabilitySlot.objects.bulk_create(slots, batch_size=500)
+
+    if patient_users and booked_every:
+        booked = AvailabilitySlot.objects.filter(doctor__in=doctor_users, booked=True).values_list("pk", flat=True)
+        Booking.objects.bulk_create(
+            (
+                Booking(slot_id=slot_id, patient=patient_users[i % len(patient_users)])
+                for i, slot_id in enumerate(booked.iterator())
+            ),
+            batch_size=500,
+        )
+
+    return doctor_users, patient_users
+
+
+def timed(fn, repeat):
+    """Call ``fn`` ``repeat`` times and return the wall times in seconds."""
+    samples = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    return (
+        f"p50={percentile(samples, 50) * 1000:.3f}ms "
+        f"p99={percentile(samples, 99) * 1000:.3f}ms "
+        f"n={len(samples)}"
+    )
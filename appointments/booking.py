@@ -0,0 +1,103 @@
+from django.db import IntegrityError, transaction
+from django.utils.timezone import localtime, now
+
+from . import live, summary
+from .models import AvailabilitySlot, Booking, CancelledBooking, WaitlistEntry
+from .schedule import day_bounds
+from .utils import queue_appointment_emails, queue_cancellation_emails
+
+
+class SlotUnavailable(Exception):
+    """The slot was booked by someone else first."""
+
+
+def day_bookings(doctor_id, day):
+    """Bookings with ``doctor_id`` that start on ``day``."""
+    day_start, day_end = day_bounds(day)
+    return Booking.objects.filter(slot__doctor_id=doctor_id, slot__start__gte=day_start, slot__start__lt=day_end)
+
+
+def claim_slot(slot_id, patient):
+    """
+    Claim ``slot_id`` for ``patient`` and return the new ``Booking``.
+
+    The claim is a single ``UPDATE ... WHERE booked = false``; whichever
+    request flips the flag wins and every other one sees zero affected rows.
+    Raises ``AvailabilitySlot.DoesNotExist`` for an unknown slot and
+    ``SlotUnavailable`` when the slot is already taken.
+    """
+    with transaction.atomic():
+        claimed = AvailabilitySlot.objects.filter(pk=slot_id, booked=False).update(booked=True)
+
+        if not claimed:
+            if not AvailabilitySlot.objects.filter(pk=slot_id).exists():
+                raise AvailabilitySlot.DoesNotExist
+            raise SlotUnavailable
+
+        slot = AvailabilitySlot.objects.select_related("doctor").get(pk=slot_id)
+        try:
+            booking = Booking.objects.create(slot=slot, patient=patient)
+        except IntegrityError as e:
+            # A stray Booking row already points at this slot.
+            raise SlotUnavailable from e
+
+        summary.record_booking(slot)
+        live.publish_on_commit("booked", slot)
+        WaitlistEntry.objects.filter(
+            doctor_id=slot.doctor_id, patient=patient, date=localtime(slot.start).date(),
+        ).delete()
+        queue_appointment_emails(doctor_user=slot.doctor, patient_user=patient, slot=slot)
+
+    return booking
+
+
+def release_booking(booking):
+    """
+    Cancel ``booking`` in one transaction.
+
+    If the slot is still ahead and a patient is waiting for the doctor on
+    that day, the earliest entry takes the slot over in the same
+    transaction, so it is never seen as free, and the new ``Booking`` is
+    returned. Patients who already hold a booking with the doctor that day
+    are passed over. Otherwise the slot is freed and ``None`` is returned, as it
+    is when the booking was already cancelled. A ``CancelledBooking`` is
+    left behind for the calendar feeds.
+    """
+    slot = booking.slot
+    patient = booking.patient
+    successor = None
+
+    with transaction.atomic():
+        booking_id = booking.pk
+        deleted, _ = booking.delete()
+        if not deleted:
+            return None
+        CancelledBooking.objects.create(
+            booking_id=booking_id, doctor_id=slot.doctor_id, patient=patient, start=slot.start, end=slot.end,
+        )
+
+        if slot.start > now():
+            day = localtime(slot.start).date()
+            entry = (
+                WaitlistEntry.objects.filter(doctor_id=slot.doctor_id, date=day)
+                .exclude(patient=patient)
+                .exclude(patient__in=day_bookings(slot.doctor_id, day).values("patient_id"))
+                .select_related("patient")
+                .order_by("created_at", "id")
+                .first()
+            )
+            if entry is not None:
+                WaitlistEntry.objects.filter(pk=entry.pk).delete()
+                successor = Booking.objects.create(slot=slot, patient=entry.patient)
+
+        if successor is None:
+            AvailabilitySlot.objects.filter(pk=slot.pk).update(booked=False)
+            slot.booked = False
+            summary.record_cancellation(slot)
+            live.publish_on_commit("freed", slot)
+
+        queue_cancellation_emails(doctor_user=slot.doctor, patient_user=patient, slot=slot)
+        if successor is not None:
+            queue_appointment_emails(doctor_user=slot.doctor, patient_user=successor.patient, slot=slot)
+
+    return successor
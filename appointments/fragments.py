@@ -0,0 +1,99 @@
+"""
+Cached HTML for the picker ``<select>`` blocks.
+
+Each fragment is rendered from a template in ``appointments/fragments/``
+and cached under a key that carries the version of the data it shows: the
+doctor's availability version for the date pickers and the roster version
+for the doctor dropdown. A hit skips both the query and the render, and a
+change simply moves readers on to a new key.
+"""
+from django.contrib.auth.models import User
+from django.template.loader import render_to_string
+from django.utils.timezone import localdate
+
+from hms import metrics
+
+from . import availability, summary
+from .versioning import CACHE_TIMEOUT, get_cache
+
+
+def _key(name, *parts):
+    return ":".join(["frag", name, *map(str, parts)])
+
+
+def _cached(key, build):
+    cache = get_cache()
+    html = cache.get(key)
+    if html is None:
+        metrics.incr("cache_misses")
+        html = build()
+        cache.set(key, html, CACHE_TIMEOUT)
+    else:
+        metrics.incr("cache_hits")
+    return html
+
+
+async def _acached(key, abuild):
+    cache = get_cache()
+    html = await cache.aget(key)
+    if html is None:
+        metrics.incr("cache_misses")
+        html = await abuild()
+        await cache.aset(key, html, CACHE_TIMEOUT)
+    else:
+        metrics.incr("cache_hits")
+    return html
+
+
+def _day(selected_date):
+    return selected_date.isoformat() if selected_date else ""
+
+
+def dashboard_date_select(doctor_id, selected_date):
+    """
+    The "Filter by Date" picker on the doctor dashboard. ``selected_date``
+    is an already parsed ``date`` or ``None``, so the key space stays bounded.
+    """
+    selected = _day(selected_date)
+    key = _key("dashboard-dates", doctor_id, availability.get_version(doctor_id), localdate().isoformat(), selected)
+    return _cached(key, lambda: render_to_string("appointments/fragments/dashboard_date_select.html", {
+        "available_dates": summary.picker_days(doctor_id, only_free=False),
+        "selected_date": selected,
+    }))
+
+
+async def adate_select(doctor_id, selected_date):
+    """
+    The date picker on the doctors list; fully booked days are shown as
+    full. ``selected_date`` is a ``date`` or ``None``.
+    """
+    selected = _day(selected_date)
+    version = await availability.aget_version(doctor_id)
+    key = _key("dates", doctor_id, version, localdate().isoformat(), selected)
+
+    async def build():
+        return render_to_string("appointments/fragments/date_select.html", {
+            "available_dates": await summary.apicker_days(doctor_id, only_free=False),
+            "selected_date": selected,
+            "enabled": True,
+        })
+
+    return await _acached(key, build)
+
+
+async def adoctor_select(selected_doctor_id):
+    """The doctor dropdown on the doctors list."""
+    version = await availability.aget_roster_version()
+    key = _key("doctors", version, selected_doctor_id or "")
+
+    async def build():
+        doctors = [
+            d async for d in
+            User.objects.filter(profile__role="doctor").only("id", "username").order_by("username")
+        ]
+        return render_to_string("appointments/fragments/doctor_select.html", {
+            "doctors": doctors,
+            "selected_doctor_id": selected_doctor_id,
+        })
+
+    return await _acached(key, build)
@@ -0,0 +1,172 @@
+"""
+Per-user iCalendar feeds.
+
+Feed URLs carry a token derived from the user's password hash, so calendar
+apps can poll without a session and a password change revokes old URLs.
+Every booking is one event with a stable UID; when it is cancelled the
+same UID is published again with ``STATUS:CANCELLED`` and a higher
+``SEQUENCE`` so subscribed calendars drop it.
+
+A rendered feed is cached under a per-user version that is bumped when one
+of the user's bookings changes, and the version is part of the ETag: a
+poll that finds nothing new costs one primary-key lookup and one cache
+read before the 304.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.timezone import now
+
+from hms import metrics
+
+from .models import Booking, CancelledBooking
+from .utils import to_gcal_format
+from .versioning import CACHE_TIMEOUT, bump, get_cache, read_version
+
+PRODID = "-//Mini HMS//Appointments//EN"
+CONFIRMED_SEQUENCE = 0
+CANCELLED_SEQUENCE = 1
+
+
+def feed_token(user):
+    return salted_hmac("appointments.ics.feed", f"{user.pk}:{user.password}", algorithm="sha256").hexdigest()[:32]
+
+
+def check_token(user, token):
+    return constant_time_compare(feed_token(user), token)
+
+
+def _version_key(user_id):
+    return f"ics:v:{user_id}"
+
+
+def _feed_key(user_id, version):
+    return f"ics:{user_id}:{version}"
+
+
+def get_version(user_id):
+    return read_version(_version_key(user_id))
+
+
+def invalidate_on_commit(*user_ids):
+    def bump_versions():
+        for user_id in user_ids:
+            bump(_version_key(user_id))
+
+    transaction.on_commit(bump_versions)
+
+
+def etag_for(user_id, version):
+    return f'"ics-{user_id}-{version}"'
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _fold(line):
+    """Fold a content line into 75-octet pieces as RFC 5545 requires."""
+    if len(line.encode()) <= 75:
+        return line + "\r\n"
+
+    pieces, current, size = [], "", 0
+    for char in line:
+        width = len(char.encode())
+        if size + width > 75:
+            pieces.append(current)
+            current, size = " ", 1
+        current += char
+        size += width
+    pieces.append(current)
+    return "\r\n".join(pieces) + "\r\n"
+
+
+def _event(booking_id, sequence, status, stamp, start, end, summary):
+    domain = getattr(settings, "ICS_UID_DOMAIN", "hms.local")
+    return "".join(_fold(line) for line in (
+        "BEGIN:VEVENT",
+        f"UID:booking-{booking_id}@{domain}",
+        f"DTSTAMP:{to_gcal_format(stamp)}",
+        f"SEQUENCE:{sequence}",
+        f"DTSTART:{to_gcal_format(start)}",
+        f"DTEND:{to_gcal_format(end)}",
+        f"SUMMARY:{_escape(summary)}",
+        f"STATUS:{status}",
+        "END:VEVENT",
+    ))
+
+
+def _querysets(user, role):
+    since = now() - timedelta(days=getattr(settings, "ICS_FEED_PAST_DAYS", 30))
+    if role == "doctor":
+        bookings = Booking.objects.filter(slot__doctor=user, slot__start__gte=since)
+        cancelled = CancelledBooking.objects.filter(doctor=user, start__gte=since)
+        other = "patient__username"
+    else:
+        bookings = Booking.objects.filter(patient=user, slot__start__gte=since)
+        cancelled = CancelledBooking.objects.filter(patient=user, start__gte=since)
+        other = "slot__doctor__username"
+
+    return bookings, cancelled, other
+
+
+def _summary(role, name):
+    return f"Appointment with {name}" if role == "doctor" else f"Appointment with Dr. {name}"
+
+
+def cached_feed(user_id, version):
+    """Return ``(last_modified, body)`` for a feed rendered under ``version``, or ``None``."""
+    entry = get_cache().get(_feed_key(user_id, version))
+    metrics.incr("cache_misses" if entry is None else "cache_hits")
+    return entry
+
+
+def stream_feed(user, role, version):
+    """
+    Return ``(last_modified, chunks)`` for ``user``'s feed.
+
+    ``chunks`` yields the calendar one event at a time and caches the full
+    body under ``version`` once it has been consumed.
+    """
+    bookings, cancelled, other = _querysets(user, role)
+    stamps = [
+        bookings.aggregate(last=Max("created_at"))["last"],
+        cancelled.aggregate(last=Max("cancelled_at"))["last"],
+    ]
+    last_modified = max((s for s in stamps if s is not None), default=None)
+
+    bookings = bookings.order_by("slot__start").values_list("id", "created_at", "slot__start", "slot__end", other)
+    cancelled = cancelled.order_by("start").values_list(
+        "booking_id", "cancelled_at", "start", "end", other.removeprefix("slot__"),
+    )
+
+    def chunks():
+        parts = ["".join(_fold(line) for line in (
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            f"PRODID:{PRODID}",
+            "CALSCALE:GREGORIAN",
+            "METHOD:PUBLISH",
+            f"X-WR-CALNAME:{_escape(f'Appointments ({user.username})')}",
+            "X-PUBLISHED-TTL:PT15M",
+        ))]
+        yield parts[0]
+
+        for booking_id, stamp, start, end, name in bookings.iterator(chunk_size=2000):
+            part = _event(booking_id, CONFIRMED_SEQUENCE, "CONFIRMED", stamp, start, end, _summary(role, name))
+            parts.append(part)
+            yield part
+
+        for booking_id, stamp, start, end, name in cancelled.iterator(chunk_size=2000):
+            part = _event(booking_id, CANCELLED_SEQUENCE, "CANCELLED", stamp, start, end, _summary(role, name))
+            parts.append(part)
+            yield part
+
+        parts.append("END:VCALENDAR\r\n")
+        yield parts[-1]
+        get_cache().set(_feed_key(user.pk, version), (last_modified, "".join(parts)), CACHE_TIMEOUT)
+
+    return last_modified, chunks()
@@ -0,0 +1,259 @@
+"""
+Live slot availability over Server-Sent Events.
+
+Booking and cancellation publish ``booked`` and ``freed`` events on one
+channel per (doctor, day) once their transaction commits, and
+``api.slot_events`` streams a channel to the doctors page. The broker is
+chosen with ``LIVE_EVENTS_BROKER``; the default ``LocalBroker`` fans out
+within the process, which covers a single ASGI worker and stands in for an
+external broker in development and tests.
+
+Each open stream is one coroutine waiting on a small bounded queue.
+Snapshots are read on pooled threads that close their database connection
+straight away. The request's own thread, which Django's sync middleware
+starts and would keep until the response ends, is let go once the first
+snapshot is out, so an idle stream holds no thread and no connection.
+Publishers never wait on readers: when a reader's buffer fills up its
+pending events are dropped and it is sent a fresh snapshot instead.
+
+Under WSGI a streaming response is read to the end before anything is
+sent, so streams are only served to ASGI requests (``can_stream``).
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache, wraps
+
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+from django.utils.timezone import localtime, now
+
+from . import availability
+
+RESYNC = "resync"
+
+_lock = threading.Lock()
+_connections = 0
+
+
+def channel_for(doctor_id, day):
+    return f"slots:{doctor_id}:{day.isoformat()}"
+
+
+class Subscription:
+    """A reader's bounded buffer, bound to the event loop it was opened on."""
+
+    def __init__(self, broker, channel, buffer_size):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(buffer_size)
+        self.lagged = False
+
+    def deliver(self, event):
+        # Always called on self.loop.
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": RESYNC})
+
+    async def get(self):
+        event = await self.queue.get()
+        if event["type"] == RESYNC:
+            self.lagged = False
+        return event
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+def _fan_out(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.deliver(event)
+
+
+class LocalBroker:
+    """
+    In-process pub/sub. ``publish`` may be called from any thread; events
+    are handed to each reader's event loop with one callback per loop.
+
+    Another broker only needs ``subscribe(channel, buffer_size)``,
+    ``unsubscribe(subscription)`` and ``publish(channel, event)``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = defaultdict(set)
+
+    def subscribe(self, channel, buffer_size):
+        subscription = Subscription(self, channel, buffer_size)
+        with self._lock:
+            self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._channels.get(subscription.channel)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._channels[subscription.channel]
+
+    def publish(self, channel, event):
+        """Queue ``event`` for every reader of ``channel``; return how many there were."""
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+
+        by_loop = defaultdict(list)
+        for subscription in subscriptions:
+            by_loop[subscription.loop].append(subscription)
+
+        for loop, group in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_fan_out, group, event)
+            except RuntimeError:
+                # The loop has closed, so nobody is reading these any more.
+                for subscription in group:
+                    self.unsubscribe(subscription)
+
+        return len(subscriptions)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, "LIVE_EVENTS_BROKER", "appointments.live.LocalBroker"))()
+
+
+def _slot_payload(pk, start, end):
+    return {"id": pk, "start": localtime(start), "end": localtime(end)}
+
+
+def publish_on_commit(kind, slot):
+    """Publish a ``booked`` or ``freed`` event for ``slot`` after the transaction commits."""
+    if kind == "freed" and slot.start <= now():
+        # Past slots are never offered, so nobody needs to hear about them.
+        return
+    channel = channel_for(slot.doctor_id, localtime(slot.start).date())
+    event = {"type": kind, **_slot_payload(slot.pk, slot.start, slot.end)}
+    transaction.on_commit(lambda: get_broker().publish(channel, event))
+
+
+def connection_count():
+    return _connections
+
+
+def _format(kind, data):
+    return f"event: {kind}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n".encode()
+
+
+def _snapshot_event(slots):
+    return _format("snapshot", [_slot_payload(s["id"], s["start"], s["end"]) for s in slots])
+
+
+def _close_connections():
+    for conn in connections.all(initialized_only=True):
+        # A connection inside a transaction, as in tests, is left alone.
+        if not conn.in_atomic_block:
+            conn.close()
+
+
+async def release_request_thread():
+    """
+    Close the current request's database connections and stop its thread.
+
+    Django's sync middleware gives every ASGI request a thread of its own,
+    the one asgiref keeps per ``ThreadSensitiveContext``; popping it is
+    what the context does on exit. A later thread-sensitive call in the
+    same request starts a new one.
+    """
+    await sync_to_async(_close_connections)()
+    context = SyncToAsync.thread_sensitive_context.get(None)
+    executor = SyncToAsync.context_to_thread_executor.pop(context, None) if context else None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def _pooled(func):
+    """Run ``func`` on a pooled thread and close any connection it opened."""
+    @wraps(func)
+    def call(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _close_connections()
+
+    return sync_to_async(call, thread_sensitive=False)
+
+
+read_snapshot = _pooled(availability.versioned_free_slots)
+_read_version = _pooled(availability.get_version)
+
+
+def can_stream(request):
+    """Whether ``request`` came through ASGI; WSGI buffers a stream whole."""
+    return isinstance(request, ASGIRequest)
+
+
+async def stream(doctor_id, day, first):
+    """
+    Yield the event stream for ``doctor_id`` on ``day``.
+
+    ``first`` is the ``(version, slots)`` pair the view got from
+    ``read_snapshot``. It is sent first, unless the
+    availability changed before the stream subscribed, and a fresh
+    snapshot is sent whenever the reader falls behind. A comment line goes
+    out every ``LIVE_EVENTS_HEARTBEAT_SECONDS`` to keep proxies from
+    closing an idle stream, and the stream ends after
+    ``LIVE_EVENTS_MAX_STREAM_SECONDS`` so the browser reconnects and
+    connections spread across workers again.
+    """
+    global _connections
+
+    heartbeat = getattr(settings, "LIVE_EVENTS_HEARTBEAT_SECONDS", 20)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, "LIVE_EVENTS_MAX_STREAM_SECONDS", 600)
+
+    subscription = get_broker().subscribe(
+        channel_for(doctor_id, day), getattr(settings, "LIVE_EVENTS_BUFFER_SIZE", 64),
+    )
+    with _lock:
+        _connections += 1
+    try:
+        version, slots = first
+        # Changes bump the version before they are published, so one that
+        # landed before the subscription shows up here.
+        if await _read_version(doctor_id) != version:
+            version, slots = await read_snapshot(doctor_id, day)
+        yield f"retry: {heartbeat * 1000}\n\n".encode()
+        yield _snapshot_event(slots)
+        await release_request_thread()
+
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                async with asyncio.timeout(min(heartbeat, remaining)):
+                    event = await subscription.get()
+            except TimeoutError:
+                yield b": ping\n\n"
+                continue
+
+            if event["type"] == RESYNC:
+                version, slots = await read_snapshot(doctor_id, day)
+                yield _snapshot_event(slots)
+            else:
+                kind, data = event["type"], {k: v for k, v in event.items() if k != "type"}
+                yield _format(kind, data)
+    finally:
+        subscription.close()
+        with _lock:
+            _connections -= 1
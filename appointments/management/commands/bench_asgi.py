@@ -0,0 +1,166 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils.timezone import localtime
+
+from appointments.benchmarks import seed, summarize
+from appointments.models import AvailabilitySlot, Booking, DayAvailability
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the read-heavy appointment pages through Django's WSGI handler "
+        "(thread pool) and ASGI handler (asyncio tasks) in-process at the same "
+        "concurrency and report throughput and p50/p99 latency for each. "
+        "Seeded rows are committed and removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=64)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--doctors", type=int, default=20)
+        parser.add_argument("--slots", type=int, default=500, help="Slots per doctor.")
+        parser.add_argument("--prefix", default="benchasgi")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        doctors, patients = seed(
+            options["doctors"], options["slots"], patients=options["doctors"], booked_every=3, prefix=prefix,
+        )
+        day = localtime(AvailabilitySlot.objects.filter(doctor=doctors[0]).earliest("start").start).date()
+
+        try:
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                cookies = []
+                for patient in patients:
+                    client = Client()
+                    client.force_login(patient)
+                    cookies.append(f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}")
+
+                paths = [
+                    (reverse("appointments:doctors_list"), {"doctor_id": d.pk, "date": day.isoformat()})
+                    for d in doctors
+                ] + [
+                    (reverse("appointments:my_bookings"), {}),
+                    (reverse("appointments:api_doctor_slots", args=[doctors[0].pk]), {"date": day.isoformat()}),
+                ]
+                plan = [
+                    (paths[i % len(paths)], cookies[i % len(cookies)])
+                    for i in range(options["requests"])
+                ]
+
+                self.report("WSGI", *self.run_wsgi(plan, options["concurrency"]))
+                self.report("ASGI", *asyncio.run(self.run_asgi(plan, options["concurrency"])))
+        finally:
+            Booking.objects.filter(patient__in=patients).delete()
+            DayAvailability.objects.filter(doctor__in=doctors).delete()
+            User.objects.filter(username__startswith=f"{prefix}_").delete()
+
+    def report(self, name, elapsed, samples, statuses):
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(f"{len(samples)} requests in {elapsed:.2f}s ({len(samples) / elapsed:.0f} req/s)")
+        self.stdout.write(summarize(samples))
+        self.stdout.write(f"status codes: {dict(sorted(statuses.items()))}")
+
+    def run_wsgi(self, plan, concurrency):
+        handler = WSGIHandler()
+        statuses = {}
+
+        def call(item):
+            (path, query), cookie = item
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": path,
+                "QUERY_STRING": urlencode(query),
+                "SCRIPT_NAME": "",
+                "SERVER_NAME": "testserver",
+                "SERVER_PORT": "80",
+                "SERVER_PROTOCOL": "HTTP/1.1",
+                "HTTP_HOST": "testserver",
+                "HTTP_COOKIE": cookie,
+                "wsgi.input": io.BytesIO(),
+                "wsgi.errors": io.StringIO(),
+                "wsgi.url_scheme": "http",
+            }
+            status = []
+            t0 = time.perf_counter()
+            body = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+            b"".join(body)
+            if hasattr(body, "close"):
+                body.close()
+            elapsed = time.perf_counter() - t0
+            return elapsed, int(status[0].split()[0])
+
+        def worker(items):
+            try:
+                return [call(item) for item in items]
+            finally:
+                connection.close()
+
+        chunks = [plan[i::concurrency] for i in range(concurrency)]
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = [r for chunk in pool.map(worker, chunks) for r in chunk]
+        elapsed = time.perf_counter() - t0
+
+        for _, code in results:
+            statuses[code] = statuses.get(code, 0) + 1
+        return elapsed, [r[0] for r in results], statuses
+
+    async def run_asgi(self, plan, concurrency):
+        handler = ASGIHandler()
+        semaphore = asyncio.Semaphore(concurrency)
+        statuses = {}
+        samples = []
+
+        async def call(item):
+            (path, query), cookie = item
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": urlencode(query).encode(),
+                "root_path": "",
+                "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+                "client": ("127.0.0.1", 0),
+                "server": ("testserver", 80),
+            }
+            disconnected = asyncio.Event()
+            sent_request = False
+
+            async def receive():
+                nonlocal sent_request
+                if not sent_request:
+                    sent_request = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    statuses[message["status"]] = statuses.get(message["status"], 0) + 1
+
+            async with semaphore:
+                t0 = time.perf_counter()
+                await handler(scope, receive, send)
+                samples.append(time.perf_counter() - t0)
+                disconnected.set()
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(call(item) for item in plan))
+        return time.perf_counter() - t0, samples, statuses
@@ -0,0 +1,97 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.db.models import Count
+
+from appointments.benchmarks import seed
+from appointments.booking import SlotUnavailable, claim_slot
+from appointments.models import AvailabilitySlot, Booking, DayAvailability, EmailOutbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire parallel bookings at the same and at different slots and report "
+        "throughput and correctness (exactly one winner per slot). Seeded rows "
+        "are committed so worker threads can see them, then deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--workers", type=int, default=32)
+        parser.add_argument("--hot-slots", type=int, default=5,
+                            help="Number of slots contended in the 'same slot' scenario.")
+        parser.add_argument("--prefix", default="benchbook")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        doctors, patients = seed(1, options["requests"], patients=options["workers"], prefix=prefix)
+        slot_ids = list(
+            AvailabilitySlot.objects.filter(doctor__in=doctors).order_by("start").values_list("pk", flat=True)
+        )
+
+        try:
+            hot = slot_ids[:options["hot_slots"]]
+            scenarios = {
+                "same slot": [hot[i % len(hot)] for i in range(options["requests"])],
+                "different slots": slot_ids,
+            }
+            for name, targets in scenarios.items():
+                self.reset(slot_ids)
+                self.run(name, targets, patients, options["workers"])
+        finally:
+            Booking.objects.filter(slot_id__in=slot_ids).delete()
+            EmailOutbox.objects.filter(to__startswith=f"{prefix}_").delete()
+            DayAvailability.objects.filter(doctor__in=doctors).delete()
+            User.objects.filter(username__startswith=f"{prefix}_").delete()
+
+    def reset(self, slot_ids):
+        Booking.objects.filter(slot_id__in=slot_ids).delete()
+        AvailabilitySlot.objects.filter(pk__in=slot_ids).update(booked=False)
+
+    def run(self, name, targets, patients, workers):
+        def attempt(i):
+            try:
+                claim_slot(targets[i], patients[i % len(patients)])
+                return "won"
+            except SlotUnavailable:
+                return "lost"
+            except OperationalError:
+                return "error"
+            finally:
+                connection.close()
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = Counter(pool.map(attempt, range(len(targets))))
+        elapsed = time.perf_counter() - t0
+
+        distinct = set(targets)
+        per_slot = Counter(
+            dict(
+                Booking.objects.filter(slot_id__in=distinct)
+                .values_list("slot_id")
+                .annotate(n=Count("id"))
+                .values_list("slot_id", "n")
+            )
+        )
+        booked = AvailabilitySlot.objects.filter(pk__in=distinct, booked=True).count()
+        correct = (
+            all(n == 1 for n in per_slot.values())
+            and booked == len(per_slot) == outcomes["won"]
+        )
+
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(
+            f"{len(targets)} requests over {len(distinct)} slots with {workers} workers "
+            f"in {elapsed:.3f}s ({len(targets) / elapsed:.0f} req/s)"
+        )
+        self.stdout.write(
+            f"won={outcomes['won']} lost={outcomes['lost']} errors={outcomes['error']} "
+            f"booked_slots={booked}"
+        )
+        style = self.style.SUCCESS if correct else self.style.ERROR
+        self.stdout.write(style("exactly one winner per booked slot" if correct else "INCONSISTENT"))
@@ -0,0 +1,64 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils.timezone import now
+
+from appointments.models import AvailabilitySlot
+from appointments.utils import appointment_messages, gcal_link_for_patient, send_notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Render and send appointment notifications in bulk and report messages "
+        "per second. Uses the in-memory email backend unless --backend is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=5000)
+        parser.add_argument("--backend", default="django.core.mail.backends.locmem.EmailBackend")
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        start = now() + timedelta(days=1)
+        doctor = User(username="bench_doctor", email="doctor@example.com")
+        patients = [User(username=f"bench_patient_{i}", email=f"patient{i}@example.com") for i in range(count)]
+        slots = [
+            AvailabilitySlot(doctor=doctor, start=start + timedelta(minutes=30 * i),
+                             end=start + timedelta(minutes=30 * (i + 1)))
+            for i in range(count)
+        ]
+
+        with override_settings(EMAIL_BACKEND=options["backend"]):
+            mail.outbox = []
+
+            t0 = time.perf_counter()
+            for patient, slot in zip(patients, slots):
+                appointment_messages(doctor, patient, slot)
+            self.report("render (text + html, 2 per booking)", 2 * count, time.perf_counter() - t0)
+
+            notifications = [
+                ("Appointment Confirmation", patient.email, "appointment_patient", {
+                    "doctor": doctor, "start": slot.start, "end": slot.end,
+                    "gcal_link": gcal_link_for_patient(doctor.username, slot.start, slot.end),
+                })
+                for patient, slot in zip(patients, slots)
+            ]
+
+            t0 = time.perf_counter()
+            sent = send_notifications(notifications)
+            self.report("render + send over one connection", sent, time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            for notification in notifications[:min(count, 500)]:
+                send_notifications([notification], connection=get_connection())
+            self.report("render + send, new connection per message", min(count, 500), time.perf_counter() - t0)
+
+            mail.outbox = []
+
+    def report(self, name, count, elapsed):
+        self.stdout.write(f"{name}: {count} messages in {elapsed:.3f}s ({count / elapsed:.0f} msg/s)")
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from appointments import ics
+from appointments.benchmarks import seed, summarize, timed
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a doctor with a busy calendar and report the latency and query "
+        "count of their .ics feed answered with a 304, served from the cache "
+        "and rendered cold. The seeded data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--slots", type=int, default=2000, help="Slots for the doctor.")
+        parser.add_argument("--booked-every", type=int, default=2)
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            doctors, _ = seed(1, options["slots"], patients=50, booked_every=options["booked_every"],
+                              prefix="benchfeeds")
+            self.run(doctors[0], options["repeat"])
+            transaction.set_rollback(True)
+
+    def run(self, doctor, repeat):
+        url = reverse("appointments:calendar_feed", args=[doctor.pk, ics.feed_token(doctor)])
+        client = Client()
+
+        def fetch(**headers):
+            response = client.get(url, headers=headers)
+            body = b"".join(response.streaming_content) if response.streaming else response.content
+            return response.status_code, len(body)
+
+        def cold(i):
+            cache.clear()
+            return fetch()
+
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            etag = client.get(url)["ETag"]
+            # Cold renders clear the cache, and with it the version in the ETag.
+            cases = {
+                "If-None-Match (304)": lambda i: fetch(if_none_match=etag),
+                "cached body": lambda i: fetch(),
+                "cold render": cold,
+            }
+
+            for name, fn in cases.items():
+                fn(0)
+                with CaptureQueriesContext(connection) as ctx:
+                    status, size = fn(0)
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.stdout.write(f"status {status}, {size} bytes, {len(ctx.captured_queries)} queries")
+                self.stdout.write(summarize(timed(fn, repeat)))
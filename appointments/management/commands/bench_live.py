@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import threading
+import time
+import tracemalloc
+import weakref
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils.timezone import localtime
+
+from appointments import live
+from appointments.benchmarks import seed, summarize
+from appointments.models import AvailabilitySlot
+
+
+class Command(BaseCommand):
+    help = (
+        "Open many idle Server-Sent Events streams through Django's ASGI "
+        "handler in-process, report the memory, threads and database "
+        "connections they hold and how long a published event takes to reach "
+        "every reader, then disconnect them all. Seeded rows are committed and "
+        "removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=1000)
+        parser.add_argument("--events", type=int, default=20)
+        parser.add_argument("--prefix", default="benchlive")
+
+    def handle(self, *args, **options):
+        # Keep the per-request log lines out of the report.
+        logging.getLogger("hms.requests").setLevel(logging.WARNING)
+        prefix = options["prefix"]
+        doctors, patients = seed(1, 40, patients=1, prefix=prefix)
+        doctor = doctors[0]
+        day = localtime(AvailabilitySlot.objects.filter(doctor=doctor).earliest("start").start).date()
+
+        try:
+            with override_settings(ALLOWED_HOSTS=["testserver"], LIVE_EVENTS_MAX_CONNECTIONS=options["connections"]):
+                client = Client()
+                client.force_login(patients[0])
+                cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+                path = reverse("appointments:api_slot_events", args=[doctor.pk])
+                asyncio.run(self.run(path, f"date={day.isoformat()}", cookie, live.channel_for(doctor.pk, day),
+                                     options["connections"], options["events"]))
+        finally:
+            User.objects.filter(username__startswith=f"{prefix}_").delete()
+
+    async def run(self, path, query, cookie, channel, connections, events):
+        opened_db = weakref.WeakSet()
+
+        def track(sender, connection, **kwargs):
+            opened_db.add(connection)
+
+        connection_created.connect(track)
+        try:
+            await self.measure(path, query, cookie, channel, connections, events,
+                               lambda: sum(c.connection is not None for c in list(opened_db)))
+        finally:
+            connection_created.disconnect(track)
+
+    async def measure(self, path, query, cookie, channel, connections, events, open_db_connections):
+        handler = ASGIHandler()
+        disconnected = asyncio.Event()
+        snapshots = asyncio.Semaphore(0)
+        received = {"count": 0, "target": 0, "done": asyncio.Event()}
+
+        async def connect():
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": query.encode(),
+                "root_path": "",
+                "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+                "client": ("127.0.0.1", 0),
+                "server": ("testserver", 80),
+            }
+            sent_request = False
+
+            async def receive():
+                nonlocal sent_request
+                if not sent_request:
+                    sent_request = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                body = message.get("body", b"")
+                if body.startswith(b"event: snapshot"):
+                    snapshots.release()
+                elif body.startswith(b"event: booked"):
+                    received["count"] += 1
+                    if received["count"] >= received["target"]:
+                        received["done"].set()
+
+            await handler(scope, receive, send)
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        tasks = [asyncio.ensure_future(connect()) for _ in range(connections)]
+        for _ in range(connections):
+            await snapshots.acquire()
+        opened = time.perf_counter() - t0
+        held = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{connections} idle streams"))
+        self.stdout.write(f"opened in {opened:.2f}s, {held / connections / 1024:.1f} KiB per connection")
+        # Let the request threads the streams gave up finish exiting.
+        await asyncio.sleep(0.5)
+        self.stdout.write(
+            f"{threading.active_count()} threads alive, "
+            f"{open_db_connections()} database connections left open by the requests"
+        )
+
+        loop = asyncio.get_running_loop()
+        broker = live.get_broker()
+        samples = []
+        for i in range(events):
+            received["done"].clear()
+            received["target"] = connections * (i + 1)
+            t0 = time.perf_counter()
+            # Published from a worker thread, as the booking views do.
+            await loop.run_in_executor(None, broker.publish, channel, {"type": "booked", "id": i})
+            await received["done"].wait()
+            samples.append(time.perf_counter() - t0)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("fan-out to every reader"))
+        self.stdout.write(summarize(samples))
+
+        disconnected.set()
+        await asyncio.gather(*tasks)
+        self.stdout.write(f"open streams after disconnect: {live.connection_count()}")
@@ -0,0 +1,87 @@
+from copy import deepcopy
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils.timezone import localtime
+
+from appointments.benchmarks import seed, summarize, timed
+from appointments.models import AvailabilitySlot
+
+CACHED_LOADERS = [
+    ("django.template.loaders.cached.Loader", [
+        "django.template.loaders.filesystem.Loader",
+        "django.template.loaders.app_directories.Loader",
+    ]),
+]
+
+
+def template_profiles():
+    """The development setup (templates re-read on every render) and the production one."""
+    development = deepcopy(settings.TEMPLATES)
+    development[0]["APP_DIRS"] = False
+    development[0]["OPTIONS"].update({
+        "debug": True,
+        "loaders": [
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ],
+    })
+
+    production = deepcopy(settings.TEMPLATES)
+    production[0]["APP_DIRS"] = False
+    production[0]["OPTIONS"].update({"debug": False, "loaders": CACHED_LOADERS})
+
+    return {"development templates": development, "production templates": production}
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the doctor dashboard and the doctors list with the picker "
+        "fragments cold and warm, under the development and production "
+        "template profiles, and report p50/p99 latency. The seeded data is "
+        "rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=200)
+        parser.add_argument("--slots", type=int, default=600, help="Slots per doctor.")
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write(f"Seeding {options['doctors']} doctors x {options['slots']} slots...")
+            doctors, patients = seed(options["doctors"], options["slots"], patients=1, booked_every=3,
+                                     prefix="benchrender")
+            self.run(doctors[0], patients[0], options["repeat"])
+            transaction.set_rollback(True)
+
+    def run(self, doctor, patient, repeat):
+        day = localtime(AvailabilitySlot.objects.filter(doctor=doctor).earliest("start").start).date()
+        pages = {
+            "doctor dashboard": (doctor, reverse("appointments:doctor_dashboard"), {}),
+            "doctors list": (patient, reverse("appointments:doctors_list"),
+                             {"doctor_id": doctor.pk, "date": day.isoformat()}),
+        }
+
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            for profile, templates in template_profiles().items():
+                with override_settings(TEMPLATES=templates):
+                    for page, (user, url, params) in pages.items():
+                        client = Client()
+                        client.force_login(user)
+
+                        def cold(i):
+                            cache.clear()
+                            client.get(url, params)
+
+                        def warm(i):
+                            client.get(url, params)
+
+                        self.stdout.write(self.style.MIGRATE_HEADING(f"{page}, {profile}"))
+                        self.stdout.write(f"cold fragments: {summarize(timed(cold, repeat))}")
+                        client.get(url, params)
+                        self.stdout.write(f"warm fragments: {summarize(timed(warm, repeat))}")
@@ -0,0 +1,57 @@
+from datetime import time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import localdate
+
+from appointments.benchmarks import percentile, seed, summarize, timed
+from appointments.search import doctors_query, earliest_free_slots, search_query
+
+SPECIALIZATIONS = ("cardiology", "dermatology", "neurology", "orthopedics", "pediatrics")
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed doctors across several specializations and report the query plan "
+        "and p50/p99 latency of the multi-doctor free-slot search against a "
+        "latency budget. The seeded data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=500)
+        parser.add_argument("--slots", type=int, default=2000, help="Slots per doctor.")
+        parser.add_argument("--booked-every", type=int, default=3)
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--budget-ms", type=float, default=25.0, help="p99 latency budget.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write(f"Seeding {options['doctors']} doctors x {options['slots']} slots...")
+            seed(
+                options["doctors"], options["slots"], patients=50, booked_every=options["booked_every"],
+                prefix="benchsearch", specializations=SPECIALIZATIONS,
+            )
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        tomorrow = localdate() + timedelta(days=1)
+        limit = options["limit"]
+        cases = {
+            "cardiology tomorrow morning": (tomorrow, tomorrow, time(8), time(12), "cardiology"),
+            "neurology, evenings over two weeks": (tomorrow, tomorrow + timedelta(days=13), time(17), time(21), "neurology"),
+            "any doctor, next week": (tomorrow, tomorrow + timedelta(days=6), time(0), None, ""),
+            "unknown specialization (empty result)": (tomorrow, tomorrow + timedelta(days=6), time(9), time(17), "podiatry"),
+        }
+
+        budget = options["budget_ms"] / 1000
+        for name, args in cases.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            first_day, _, after, before, specialization = args
+            doctor_ids = list(doctors_query(specialization)) if specialization else None
+            self.stdout.write(search_query(first_day, first_day, after, before, doctor_ids, limit).explain())
+            samples = timed(lambda i: earliest_free_slots(*args, limit=limit), options["repeat"])
+            self.stdout.write(f"{len(earliest_free_slots(*args, limit=limit))} results, {summarize(samples)}")
+            style = self.style.SUCCESS if percentile(samples, 99) <= budget else self.style.ERROR
+            self.stdout.write(style(f"p99 budget {options['budget_ms']:g}ms") + "\n")
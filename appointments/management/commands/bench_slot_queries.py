@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import localtime, now
+
+from appointments.benchmarks import seed, summarize, timed
+from appointments.models import AvailabilitySlot, Booking
+from appointments.schedule import day_bounds
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed N doctors x M slots and report the query plan and p50/p99 latency "
+        "of the slot queries behind doctors_list, doctor_dashboard and my_bookings. "
+        "The seeded data is rolled back unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=50)
+        parser.add_argument("--slots", type=int, default=2000, help="Slots per doctor.")
+        parser.add_argument("--patients", type=int, default=200)
+        parser.add_argument("--booked-every", type=int, default=4)
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument("--keep", action="store_true")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write(
+                f"Seeding {options['doctors']} doctors x {options['slots']} slots..."
+            )
+            doctors, patients = seed(
+                options["doctors"],
+                options["slots"],
+                patients=options["patients"],
+                booked_every=options["booked_every"],
+            )
+            self.run(doctors, patients, options["repeat"])
+
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+    def run(self, doctors, patients, repeat):
+        current_time = now()
+        day = localtime(doctors[0].doctor_slots.order_by("start").first().start).date()
+        day_start, day_end = day_bounds(day)
+
+        def doctor(i):
+            return doctors[i % len(doctors)]
+
+        cases = {
+            "doctors_list (day range)": lambda i: AvailabilitySlot.objects.filter(
+                doctor=doctor(i), booked=False, start__gt=current_time,
+                start__gte=day_start, start__lt=day_end,
+            ).order_by("start"),
+            "doctors_list (legacy start__date)": lambda i: AvailabilitySlot.objects.filter(
+                doctor=doctor(i), booked=False, start__gt=current_time, start__date=day,
+            ).order_by("start"),
+            "doctor_dashboard (all slots)": lambda i: AvailabilitySlot.objects.filter(
+                doctor=doctor(i),
+            ).order_by("start"),
+            "doctor_dashboard (day range)": lambda i: AvailabilitySlot.objects.filter(
+                doctor=doctor(i), start__gte=day_start, start__lt=day_end,
+            ).order_by("start"),
+            "my_bookings (doctor)": lambda i: Booking.objects.filter(
+                slot__doctor=doctor(i),
+            ).order_by("slot__start"),
+        }
+        if patients:
+            cases["my_bookings (patient)"] = lambda i: Booking.objects.filter(
+                patient=patients[i % len(patients)],
+            ).order_by("slot__start")
+
+        for name, build in cases.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(build(0).explain())
+            samples = timed(lambda i: list(build(i)), repeat)
+            self.stdout.write(summarize(samples) + "\n")
@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils.timezone import localtime
+
+from appointments.benchmarks import seed, summarize
+from appointments.models import AvailabilitySlot, Booking, DayAvailability, EmailOutbox
+
+BASELINE_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare mixed doctors_list / book_slot throughput on SQLite with the "
+        "default settings and with the production profile (WAL, synchronous=NORMAL, "
+        "busy timeout, BEGIN IMMEDIATE). Run it against a scratch database file: "
+        "seeded rows are committed and removed afterwards, and the journal mode "
+        "of the file is left in WAL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--ops", type=int, default=100, help="Requests per worker.")
+        parser.add_argument("--write-every", type=int, default=5,
+                            help="Every Nth request of a worker is a booking; the rest are reads.")
+        parser.add_argument("--doctors", type=int, default=5)
+        parser.add_argument("--prefix", default="benchsqlite")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite" or connection.settings_dict["NAME"] == ":memory:":
+            raise CommandError("bench_sqlite needs a file-backed SQLite database.")
+
+        workers, ops = options["workers"], options["ops"]
+        writes_per_worker = ops // options["write_every"] + 1
+        slots_per_doctor = 2 * workers * writes_per_worker // options["doctors"] + 1
+        prefix = options["prefix"]
+
+        doctors, patients = seed(options["doctors"], slots_per_doctor, patients=workers, prefix=prefix)
+        slot_ids = list(
+            AvailabilitySlot.objects.filter(doctor__in=doctors).order_by("start").values_list("pk", flat=True)
+        )
+        first_day = localtime(AvailabilitySlot.objects.get(pk=slot_ids[0]).start).date()
+
+        profiles = {
+            "default": (BASELINE_PRAGMAS, {}),
+            "production": (settings.SQLITE_PRODUCTION_PRAGMAS, {"timeout": 20, "transaction_mode": "IMMEDIATE"}),
+        }
+
+        try:
+            for name, (pragmas, db_options) in profiles.items():
+                Booking.objects.filter(slot_id__in=slot_ids).delete()
+                AvailabilitySlot.objects.filter(pk__in=slot_ids).update(booked=False)
+                connections.close_all()
+
+                saved = connections.settings["default"].get("OPTIONS", {})
+                connections.settings["default"]["OPTIONS"] = db_options
+                try:
+                    with override_settings(SQLITE_PRAGMAS=pragmas, ALLOWED_HOSTS=["testserver"]):
+                        self.run(name, doctors, patients, slot_ids, first_day, options)
+                finally:
+                    connections.settings["default"]["OPTIONS"] = saved
+                    connections.close_all()
+        finally:
+            Booking.objects.filter(slot_id__in=slot_ids).delete()
+            EmailOutbox.objects.filter(to__startswith=f"{prefix}_").delete()
+            DayAvailability.objects.filter(doctor__in=doctors).delete()
+            User.objects.filter(username__startswith=f"{prefix}_").delete()
+
+    def run(self, name, doctors, patients, slot_ids, first_day, options):
+        workers, ops, write_every = options["workers"], options["ops"], options["write_every"]
+        lock = threading.Lock()
+        reads, writes, errors = [], [], []
+        list_url = reverse("appointments:doctors_list")
+
+        def worker(w):
+            client = Client()
+            client.force_login(patients[w])
+            # Each worker books its own slots so only lock contention is measured.
+            own = slot_ids[w::workers]
+            local_reads, local_writes, local_errors = [], [], 0
+
+            try:
+                for i in range(ops):
+                    t0 = time.perf_counter()
+                    try:
+                        if i % write_every == 0 and own:
+                            client.get(reverse("appointments:book_slot", args=[own.pop()]))
+                            local_writes.append(time.perf_counter() - t0)
+                        else:
+                            client.get(list_url, {
+                                "doctor_id": doctors[i % len(doctors)].pk,
+                                "date": first_day.isoformat(),
+                            })
+                            local_reads.append(time.perf_counter() - t0)
+                    except OperationalError:
+                        local_errors += 1
+                client.logout()
+            finally:
+                connection.close()
+
+            with lock:
+                reads.extend(local_reads)
+                writes.extend(local_writes)
+                errors.append(local_errors)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(worker, range(workers)))
+        elapsed = time.perf_counter() - t0
+
+        total = len(reads) + len(writes)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{name} profile"))
+        self.stdout.write(f"{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s), "
+                          f"{sum(errors)} 'database is locked' errors")
+        self.stdout.write(f"doctors_list: {summarize(reads)}")
+        self.stdout.write(f"book_slot:    {summarize(writes)}")
@@ -0,0 +1,94 @@
+from datetime import date, time
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from appointments.schedule import ALL_WEEKDAYS, SLOT_DURATIONS, generate_slots
+from hms.dataio import FORMATS, chunked, detect_format, open_path, read_records
+
+
+def _weekdays(value):
+    if not value:
+        return ALL_WEEKDAYS
+    if isinstance(value, str):
+        value = value.split(",")
+    return tuple(int(v) for v in value)
+
+
+def _breaks(value):
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = [b.split("-") for b in value.split(";") if b.strip()]
+    return tuple((time.fromisoformat(start.strip()), time.fromisoformat(end.strip())) for start, end in value)
+
+
+def _slot_minutes(value):
+    minutes = int(value or 30)
+    if minutes not in SLOT_DURATIONS:
+        raise ValueError(f"slot_minutes must be one of {', '.join(map(str, SLOT_DURATIONS))}, got {minutes}")
+    return minutes
+
+
+def parse_template(record):
+    return {
+        "start_date": date.fromisoformat(record["start_date"]),
+        "end_date": date.fromisoformat(record["end_date"]),
+        "day_start": time.fromisoformat(record["day_start"]),
+        "day_end": time.fromisoformat(record["day_end"]),
+        "weekdays": _weekdays(record.get("weekdays")),
+        "slot_minutes": _slot_minutes(record.get("slot_minutes")),
+        "breaks": _breaks(record.get("breaks")),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Import weekly availability templates from a CSV or JSON Lines file "
+        "('-' for stdin). Each row names a doctor by username and gives "
+        "start_date, end_date, day_start, day_end and optionally weekdays "
+        "(0=Monday, comma separated), slot_minutes (15, 30, 45 or 60) and "
+        "breaks (HH:MM-HH:MM, semicolon separated). Future slots are generated "
+        "with the same code as the doctor dashboard; existing ones are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=200, help="Templates per transaction.")
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options["path"], options["format"])
+        templates = slots = skipped = 0
+        t0 = perf_counter()
+
+        with open_path(options["path"]) as stream:
+            for chunk in chunked(read_records(stream, fmt), options["chunk_size"]):
+                doctors = dict(
+                    User.objects.filter(
+                        username__in={r.get("doctor") for r in chunk}, profile__role="doctor",
+                    ).values_list("username", "pk")
+                )
+                with transaction.atomic():
+                    for record in chunk:
+                        doctor_id = doctors.get(record.get("doctor"))
+                        try:
+                            template = parse_template(record)
+                        except (KeyError, TypeError, ValueError) as exc:
+                            doctor_id = None
+                            self.stderr.write(f"Skipping template for {record.get('doctor')!r}: {exc}")
+                        if doctor_id is None:
+                            skipped += 1
+                            continue
+                        slots += len(generate_slots(User(pk=doctor_id), **template))
+                        templates += 1
+
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"{templates} templates, {slots} slots")
+
+        elapsed = perf_counter() - t0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {templates} templates ({slots} slots) in {elapsed:.1f}s ({skipped} skipped)."
+        ))
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from appointments import retention
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove slots older than the retention period: unbooked ones are "
+        "deleted and booked ones are moved with their booking to "
+        "ArchivedBooking, in small transactions. Then run an incremental "
+        "vacuum and report the rows moved and bytes reclaimed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=getattr(settings, "SLOT_RETENTION_DAYS", 90),
+            help="Keep slots that started within this many days.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument("--no-vacuum", action="store_true")
+        parser.add_argument(
+            "--full-vacuum", action="store_true",
+            help="Rewrite the file once with VACUUM, switching it to incremental auto_vacuum.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = retention.cutoff_for(options["days"])
+
+        if options["dry_run"]:
+            self.stdout.write(
+                f"[dry run] would delete {retention.unbooked_slots(cutoff).count()} unbooked slots and archive "
+                f"{retention.booked_slots(cutoff).count()} bookings that started before {cutoff:%Y-%m-%d}."
+            )
+            return
+
+        deleted = retention.prune_unbooked(cutoff, options["batch_size"])
+        archived = retention.archive_booked(cutoff, options["batch_size"])
+        summaries = retention.prune_day_summaries(cutoff)
+        cancellations = retention.prune_cancellations(cutoff)
+        self.stdout.write(
+            f"Deleted {deleted} unbooked slots, archived {archived} bookings "
+            f"and dropped {summaries} day summaries and {cancellations} cancellations before {cutoff:%Y-%m-%d}."
+        )
+
+        if options["no_vacuum"]:
+            return
+        reclaimed = retention.reclaim_space(full=options["full_vacuum"])
+        if reclaimed is None:
+            self.stdout.write(
+                "Incremental vacuum unavailable; run once with --full-vacuum to enable it."
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Reclaimed {reclaimed} bytes."))
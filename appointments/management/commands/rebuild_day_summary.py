@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils.timezone import localtime
+
+from appointments.models import AvailabilitySlot
+from appointments.summary import refresh_days
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-doctor DayAvailability summary from AvailabilitySlot."
+
+    def handle(self, *args, **options):
+        ranges = (
+            AvailabilitySlot.objects.values("doctor_id")
+            .annotate(first=Min("start"), last=Max("start"))
+            .order_by("doctor_id")
+        )
+
+        doctors = 0
+        for r in ranges:
+            with transaction.atomic():
+                refresh_days(r["doctor_id"], localtime(r["first"]).date(), localtime(r["last"]).date())
+            doctors += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt day summaries for {doctors} doctors."))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from appointments.outbox import drain
+
+
+class Command(BaseCommand):
+    help = "Deliver queued appointment emails from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--max-attempts", type=int, default=None)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the outbox instead of exiting once it is empty.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to sleep between polls when the outbox is empty.",
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_retried = total_failed = 0
+
+        while True:
+            sent, retried, failed = drain(
+                batch_size=options["batch_size"],
+                max_attempts=options["max_attempts"],
+            )
+            total_sent += sent
+            total_retried += retried
+            total_failed += failed
+
+            if sent or retried or failed:
+                self.stdout.write(f"sent={sent} retried={retried} failed={failed}")
+                continue
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Outbox drained: {total_sent} sent, {total_retried} retried, {total_failed} failed."
+        ))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from appointments.reminders import dispatch
+
+
+class Command(BaseCommand):
+    help = "Email patients and doctors about appointments starting soon. Safe to re-run."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=float, default=24, help="Reminder window from now, in hours.")
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent mail connections.")
+        parser.add_argument("--chunk-size", type=int, default=100, help="Messages per connection batch.")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        stats = dispatch(
+            window=timedelta(hours=options["hours"]),
+            workers=options["workers"],
+            chunk_size=options["chunk_size"],
+            dry_run=options["dry_run"],
+        )
+
+        prefix = "[dry run] would send" if options["dry_run"] else "Sent"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {stats['messages']} reminders covering {stats['bookings']} bookings"
+            f" ({stats['failed_chunks']} failed chunks)."
+        ))
@@ -0,0 +1,57 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+
+
+def missing_indexes():
+    """
+    Yield ``(model, index)`` for every ``Meta.indexes`` entry of an app
+    without migrations whose table exists but lacks the index.
+
+    ``migrate --run-syncdb`` only creates missing tables; it never adds an
+    index to a table that is already there.
+    """
+    migrated = MigrationLoader(None, ignore_no_migrations=True).migrated_apps
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        for app_config in apps.get_app_configs():
+            if app_config.label in migrated:
+                continue
+            for model in app_config.get_models():
+                table = model._meta.db_table
+                if table not in tables or not model._meta.indexes:
+                    continue
+                existing = connection.introspection.get_constraints(cursor, table)
+                for index in model._meta.indexes:
+                    if index.name not in existing:
+                        yield model, index
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the Meta.indexes that existing tables are missing. The project "
+        "ships no migrations, so indexes added to a model after its table was "
+        "created only reach the database through this command."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only list the missing indexes.")
+
+    def handle(self, *args, **options):
+        missing = list(missing_indexes())
+        if not missing:
+            self.stdout.write("All indexes are present.")
+            return
+
+        # Only used to build the statements: entering the editor would turn
+        # off SQLite's foreign key checks, which cannot happen in a transaction.
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model, index in missing:
+                self.stdout.write(f"{model._meta.db_table}: {index.name}")
+                if not options["dry_run"]:
+                    cursor.execute(str(index.create_sql(model, editor)))
+
+        verb = "Would create" if options["dry_run"] else "Created"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(missing)} indexes."))
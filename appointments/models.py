@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class AvailabilitySlot(models.Model):
@@ -10,6 +11,15 @@ class AvailabilitySlot(models.Model):
     class Meta:
         ordering = ["start"]
         unique_together = ("doctor", "start", "end")
+        indexes = [
+            models.Index(fields=["start"], name="slot_start_idx"),
+            models.Index(
+                fields=["doctor", "start"],
+                condition=models.Q(booked=False),
+                name="slot_free_doctor_start_idx",
+            ),
+            models.Index(fields=["start"], condition=models.Q(booked=False), name="slot_free_start_idx"),
+        ]
 
     def __str__(self):
         return f"{self.doctor.username} — {self.start} to {self.end} ({'Booked' if self.booked else 'Free'})"
@@ -23,3 +33,120 @@ class Booking(models.Model):
 
     def __str__(self):
         return f"{self.patient.username} → {self.slot}"
+
+
+class ArchivedBooking(models.Model):
+    """A past booking and its slot, moved out of the live tables by ``prune_slots``."""
+    booking_id = models.BigIntegerField(unique=True)
+    slot_id = models.BigIntegerField()
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_doctor_bookings")
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_patient_bookings")
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    booked_at = models.DateTimeField()
+    notes = models.TextField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["start"]
+        indexes = [
+            models.Index(fields=["doctor", "start"], name="archive_doctor_start_idx"),
+            models.Index(fields=["patient", "start"], name="archive_patient_start_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.patient.username} → {self.doctor.username} at {self.start} (archived)"
+
+
+class CancelledBooking(models.Model):
+    """A cancelled booking, kept so calendar feeds can mark its event cancelled."""
+    booking_id = models.BigIntegerField(unique=True)
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="cancelled_doctor_bookings")
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="cancelled_patient_bookings")
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    cancelled_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["start"]
+        indexes = [
+            models.Index(fields=["doctor", "start"], name="cancelled_doctor_start_idx"),
+            models.Index(fields=["patient", "start"], name="cancelled_patient_start_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.patient.username} → {self.doctor.username} at {self.start} (cancelled)"
+
+
+class WaitlistEntry(models.Model):
+    """A patient waiting for any slot with ``doctor`` on ``date``; served first come, first served."""
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="waitlist_entries")
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="waitlisted")
+    date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        unique_together = ("doctor", "patient", "date")
+        indexes = [models.Index(fields=["doctor", "date", "created_at"], name="waitlist_doctor_date_idx")]
+        verbose_name_plural = "waitlist entries"
+
+    def __str__(self):
+        return f"{self.patient.username} waiting for {self.doctor.username} on {self.date}"
+
+
+class BookingReminder(models.Model):
+    PATIENT = "patient"
+    DOCTOR = "doctor"
+    RECIPIENT_CHOICES = ((PATIENT, "Patient"), (DOCTOR, "Doctor"))
+
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name="reminders")
+    recipient = models.CharField(max_length=10, choices=RECIPIENT_CHOICES)
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("booking", "recipient")
+
+    def __str__(self):
+        return f"Reminder to {self.recipient} for booking {self.booking_id}"
+
+
+class DayAvailability(models.Model):
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="day_availability")
+    date = models.DateField()
+    free_count = models.PositiveIntegerField(default=0)
+    booked_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["date"]
+        unique_together = ("doctor", "date")
+        verbose_name_plural = "day availability"
+
+    def __str__(self):
+        return f"{self.doctor.username} — {self.date} ({self.free_count} free, {self.booked_count} booked)"
+
+
+class EmailOutbox(models.Model):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = ((PENDING, "Pending"), (SENT, "Sent"), (FAILED, "Failed"))
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True, default="")
+    html_body = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=255, blank=True, default="")
+    to = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.subject} → {self.to} ({self.status})"
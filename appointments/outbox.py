@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+
+from hms import metrics
+
+from .models import EmailOutbox
+
+
+def enqueue(messages):
+    """
+    Store outgoing emails as ``EmailOutbox`` rows.
+
+    ``messages`` is an iterable of dicts with ``subject``, ``to``, ``html_body``
+    and optionally ``body``. Call this inside the same transaction as the
+    change that triggers the email so both commit (or roll back) together.
+    """
+    rows = [
+        EmailOutbox(
+            subject=m["subject"],
+            to=m["to"],
+            body=m.get("body", ""),
+            html_body=m.get("html_body", ""),
+            from_email=settings.EMAIL_HOST_USER,
+        )
+        for m in messages
+        if m.get("to")
+    ]
+    return EmailOutbox.objects.bulk_create(rows)
+
+
+def backoff_delay(attempts):
+    base = getattr(settings, "EMAIL_OUTBOX_BACKOFF_SECONDS", 30)
+    cap = getattr(settings, "EMAIL_OUTBOX_BACKOFF_MAX_SECONDS", 3600)
+    return timedelta(seconds=min(cap, base * 2 ** (attempts - 1)))
+
+
+def claim_batch(batch_size, lease_seconds=300):
+    """
+    Lease up to ``batch_size`` due messages by pushing their
+    ``next_attempt_at`` into the future. A worker that dies mid-batch
+    leaves the rows to be picked up again once the lease expires.
+    """
+    current = timezone.now()
+    ids = list(
+        EmailOutbox.objects.filter(
+            status=EmailOutbox.PENDING,
+            next_attempt_at__lte=current,
+        ).order_by("next_attempt_at", "id").values_list("pk", flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+
+    lease_until = current + timedelta(seconds=lease_seconds)
+    EmailOutbox.objects.filter(
+        pk__in=ids,
+        status=EmailOutbox.PENDING,
+        next_attempt_at__lte=current,
+    ).update(next_attempt_at=lease_until)
+
+    return list(EmailOutbox.objects.filter(pk__in=ids, next_attempt_at=lease_until))
+
+
+def build_message(row, connection):
+    msg = EmailMultiAlternatives(
+        row.subject,
+        row.body,
+        row.from_email or settings.DEFAULT_FROM_EMAIL,
+        [row.to],
+        connection=connection,
+    )
+    if row.html_body:
+        msg.attach_alternative(row.html_body, "text/html")
+    return msg
+
+
+def drain(batch_size=None, max_attempts=None, connection=None):
+    """
+    Send one batch of due messages over a single SMTP connection.
+
+    Returns a ``(sent, retried, failed)`` tuple of counts.
+    """
+    batch_size = batch_size or getattr(settings, "EMAIL_OUTBOX_BATCH_SIZE", 100)
+    max_attempts = max_attempts or getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 5)
+
+    rows = claim_batch(batch_size)
+    if not rows:
+        return 0, 0, 0
+
+    connection = connection or get_connection()
+    sent = retried = failed = 0
+
+    try:
+        with metrics.timer("smtp_seconds"):
+            connection.open()
+        open_error = None
+    except Exception as e:
+        # Could not reach the mail server at all; every row gets a retry.
+        open_error = e
+
+    try:
+        for row in rows:
+            try:
+                if open_error:
+                    raise open_error
+                with metrics.timer("smtp_seconds"):
+                    build_message(row, connection).send()
+            except Exception as e:
+                _record_failure(row, e, max_attempts)
+                if row.status == EmailOutbox.FAILED:
+                    failed += 1
+                else:
+                    retried += 1
+            else:
+                row.status = EmailOutbox.SENT
+                row.attempts += 1
+                row.sent_at = timezone.now()
+                row.last_error = ""
+                sent += 1
+    finally:
+        if not open_error:
+            connection.close()
+
+    EmailOutbox.objects.bulk_update(
+        rows, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+    )
+    return sent, retried, failed
+
+
+def _record_failure(row, error, max_attempts):
+    row.attempts += 1
+    row.last_error = str(error)
+    if row.attempts >= max_attempts:
+        row.status = EmailOutbox.FAILED
+    else:
+        row.next_attempt_at = timezone.now() + backoff_delay(row.attempts)
@@ -0,0 +1,66 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+PAGE_SIZE = 50
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(start, pk):
+    raw = f"{start.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        start, pk = raw.split("|")
+        return datetime.fromisoformat(start), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def keyset_page(queryset, cursor=None, page_size=PAGE_SIZE, start_field="start"):
+    """
+    Return ``(items, next_cursor)`` for the page of ``queryset`` after
+    ``cursor``, ordered by ``(start_field, id)``.
+
+    Unlike OFFSET pagination every page is a bounded index range scan, so
+    page 1000 costs the same as page 1. ``next_cursor`` is ``None`` on the
+    last page.
+    """
+    queryset = _page_queryset(queryset, cursor, page_size, start_field)
+    return _split_page(list(queryset), page_size, start_field)
+
+
+async def akeyset_page(queryset, cursor=None, page_size=PAGE_SIZE, start_field="start"):
+    queryset = _page_queryset(queryset, cursor, page_size, start_field)
+    return _split_page([item async for item in queryset], page_size, start_field)
+
+
+def _page_queryset(queryset, cursor, page_size, start_field):
+    queryset = queryset.order_by(start_field, "id")
+
+    if cursor:
+        start, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f"{start_field}__gt": start}) | Q(**{start_field: start, "id__gt": pk})
+        )
+
+    return queryset[:page_size + 1]
+
+
+def _split_page(items, page_size, start_field):
+    if len(items) <= page_size:
+        return items, None
+
+    items = items[:page_size]
+    last = items[-1]
+    value = last
+    for part in start_field.split("__"):
+        value = getattr(value, part)
+    return items, encode_cursor(value, last.pk)
@@ -0,0 +1,154 @@
+"""
+Bulk reminders for upcoming appointments.
+
+Due bookings are read with range queries on ``slot__start`` per
+recipient kind, in keyset pages in recipient order so each patient or
+doctor gets a single digest. Digests are sent in chunks over pooled
+connections by a bounded thread pool. As soon as a chunk is confirmed
+delivered, a ``BookingReminder`` row is written for each booking it
+covers, so re-runs skip it and a crash only resends the chunks in flight.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Exists, OuterRef, Q
+from django.utils.timezone import now
+
+from .models import Booking, BookingReminder
+from .utils import render_email
+
+ITERATOR_CHUNK_SIZE = 2000
+
+
+def _recipient_field(recipient):
+    return "patient_id" if recipient == BookingReminder.PATIENT else "slot__doctor_id"
+
+
+def due_bookings(recipient, window_start, window_end):
+    key = _recipient_field(recipient)
+    return (
+        Booking.objects.filter(slot__start__gte=window_start, slot__start__lt=window_end)
+        .exclude(Exists(BookingReminder.objects.filter(booking=OuterRef("pk"), recipient=recipient)))
+        .select_related("slot__doctor", "patient")
+        .only(
+            "id", "patient_id", "slot__start", "slot__end",
+            "slot__doctor__username", "slot__doctor__email",
+            "patient__username", "patient__email",
+        )
+        .order_by(key, "slot__start", "id")
+    )
+
+
+def build_digest(recipient, bookings):
+    if recipient == BookingReminder.PATIENT:
+        user = bookings[0].patient
+        subject = "Appointment Reminder"
+    else:
+        user = bookings[0].slot.doctor
+        subject = "Upcoming Appointments"
+
+    body, html_body = render_email(f"reminder_{recipient}", {"recipient": user, "bookings": bookings})
+    msg = EmailMultiAlternatives(subject, body, settings.DEFAULT_FROM_EMAIL, [user.email])
+    msg.attach_alternative(html_body, "text/html")
+    return msg
+
+
+def _send_chunk(messages):
+    connection = get_connection()
+    return connection.send_messages(messages) or 0
+
+
+def _record(recipient, booking_ids):
+    BookingReminder.objects.bulk_create(
+        [BookingReminder(booking_id=pk, recipient=recipient) for pk in booking_ids],
+        ignore_conflicts=True,
+    )
+
+
+def _due_pages(recipient, window_start, window_end):
+    """
+    Yield the due bookings page by page, ordered like ``due_bookings``.
+
+    Each page is a separate short query after the last row of the previous
+    one, so no read cursor stays open on the connection while delivered
+    chunks are being recorded on it.
+    """
+    key = _recipient_field(recipient)
+    queryset = due_bookings(recipient, window_start, window_end)
+    after = Q()
+    while True:
+        page = list(queryset.filter(after)[:ITERATOR_CHUNK_SIZE])
+        yield from page
+        if len(page) < ITERATOR_CHUNK_SIZE:
+            return
+        last = page[-1]
+        owner = last.patient_id if recipient == BookingReminder.PATIENT else last.slot.doctor_id
+        after = (
+            Q(**{f"{key}__gt": owner})
+            | Q(**{key: owner, "slot__start__gt": last.slot.start})
+            | Q(**{key: owner, "slot__start": last.slot.start, "id__gt": last.pk})
+        )
+
+
+def dispatch(window=timedelta(hours=24), workers=4, chunk_size=100, dry_run=False):
+    """
+    Send reminders for bookings starting within ``window`` from now.
+
+    Returns a dict with ``messages``, ``bookings`` and ``failed_chunks`` counts.
+    """
+    window_start = now()
+    window_end = window_start + window
+    stats = {"messages": 0, "bookings": 0, "failed_chunks": 0}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for recipient in (BookingReminder.PATIENT, BookingReminder.DOCTOR):
+            _dispatch_recipient(pool, recipient, window_start, window_end, workers, chunk_size, dry_run, stats)
+
+    return stats
+
+
+def _dispatch_recipient(pool, recipient, window_start, window_end, workers, chunk_size, dry_run, stats):
+    inflight = deque()
+
+    def collect(entry):
+        future, booking_ids = entry
+        try:
+            future.result()
+        except Exception:
+            stats["failed_chunks"] += 1
+            return
+        _record(recipient, booking_ids)
+        stats["bookings"] += len(booking_ids)
+
+    def submit(messages, booking_ids):
+        stats["messages"] += len(messages)
+        if dry_run:
+            stats["bookings"] += len(booking_ids)
+            return
+        inflight.append((pool.submit(_send_chunk, messages), booking_ids))
+        # Bound memory: never hold more than two chunks per worker.
+        while len(inflight) >= 2 * workers:
+            collect(inflight.popleft())
+
+    rows = _due_pages(recipient, window_start, window_end)
+    key = (lambda b: b.patient_id) if recipient == BookingReminder.PATIENT else (lambda b: b.slot.doctor_id)
+
+    messages, booking_ids = [], []
+    for _, group in groupby(rows, key=key):
+        bookings = list(group)
+        messages.append(build_digest(recipient, bookings))
+        booking_ids.extend(b.pk for b in bookings)
+
+        if len(messages) >= chunk_size:
+            submit(messages, booking_ids)
+            messages, booking_ids = [], []
+
+    if messages:
+        submit(messages, booking_ids)
+
+    while inflight:
+        collect(inflight.popleft())
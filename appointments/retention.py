@@ -0,0 +1,135 @@
+"""
+Retention for past availability.
+
+Slots that started before the cutoff leave the live tables in small
+transactions: free slots are deleted, booked ones are copied with their
+booking into ``ArchivedBooking`` first. Rows go by primary key with plain
+``DELETE`` statements; the per-row delete signals only invalidate cached
+future availability, which past slots are never part of. Freed pages are
+then returned to the filesystem with SQLite's incremental vacuum.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils.timezone import localdate
+
+from .models import ArchivedBooking, AvailabilitySlot, Booking, BookingReminder, CancelledBooking, DayAvailability
+from .schedule import day_bounds
+
+
+def cutoff_for(days):
+    """Start of the local day ``days`` days ago."""
+    return day_bounds(localdate() - timedelta(days=days))[0]
+
+
+def _delete_ids(model, ids, column="id"):
+    if not ids:
+        return 0
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {qn(model._meta.db_table)} WHERE {qn(column)} IN ({', '.join(['%s'] * len(ids))})",
+            ids,
+        )
+        return cursor.rowcount
+
+
+def unbooked_slots(cutoff):
+    return AvailabilitySlot.objects.filter(start__lt=cutoff, booking__isnull=True)
+
+
+def booked_slots(cutoff):
+    return Booking.objects.filter(slot__start__lt=cutoff)
+
+
+def prune_unbooked(cutoff, batch_size=1000):
+    """Delete slots without a booking that started before ``cutoff``."""
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(unbooked_slots(cutoff).order_by("start").values_list("pk", flat=True)[:batch_size])
+            deleted += _delete_ids(AvailabilitySlot, ids)
+        if len(ids) < batch_size:
+            return deleted
+
+
+def archive_booked(cutoff, batch_size=1000):
+    """Move bookings whose slot started before ``cutoff`` to ``ArchivedBooking``."""
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                booked_slots(cutoff).order_by("slot__start").values(
+                    "id", "slot_id", "slot__doctor_id", "patient_id",
+                    "slot__start", "slot__end", "created_at", "notes",
+                )[:batch_size]
+            )
+            ArchivedBooking.objects.bulk_create(
+                [
+                    ArchivedBooking(
+                        booking_id=r["id"],
+                        slot_id=r["slot_id"],
+                        doctor_id=r["slot__doctor_id"],
+                        patient_id=r["patient_id"],
+                        start=r["slot__start"],
+                        end=r["slot__end"],
+                        booked_at=r["created_at"],
+                        notes=r["notes"],
+                    )
+                    for r in rows
+                ],
+                ignore_conflicts=True,
+            )
+            booking_ids = [r["id"] for r in rows]
+            _delete_ids(BookingReminder, booking_ids, column="booking_id")
+            _delete_ids(Booking, booking_ids)
+            _delete_ids(AvailabilitySlot, [r["slot_id"] for r in rows])
+            archived += len(rows)
+        if len(rows) < batch_size:
+            return archived
+
+
+def prune_day_summaries(cutoff):
+    return DayAvailability.objects.filter(date__lt=localdate(cutoff)).delete()[0]
+
+
+def prune_cancellations(cutoff):
+    return CancelledBooking.objects.filter(start__lt=cutoff).delete()[0]
+
+
+def _pragma(cursor, name):
+    cursor.execute(f"PRAGMA {name}")
+    return cursor.fetchone()[0]
+
+
+def file_stats():
+    """``(page_size, page_count, freelist_count)`` of the SQLite database."""
+    with connection.cursor() as cursor:
+        return tuple(_pragma(cursor, name) for name in ("page_size", "page_count", "freelist_count"))
+
+
+def reclaim_space(full=False):
+    """
+    Return free pages to the filesystem and report the bytes reclaimed.
+
+    Incremental vacuum only works once the database is in
+    ``auto_vacuum = INCREMENTAL`` mode, which takes one full ``VACUUM``
+    to switch on; ``full=True`` does that (it rewrites the whole file).
+    Returns ``None`` when nothing could be done.
+    """
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        return None
+
+    page_size, before, _ = file_stats()
+    with connection.cursor() as cursor:
+        if full:
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+        elif _pragma(cursor, "auto_vacuum") == 2:
+            # The pragma frees one page per step and the DB-API cursor only
+            # steps once; executescript() runs it to completion.
+            connection.connection.executescript("PRAGMA incremental_vacuum")
+        else:
+            return None
+    _, after, _ = file_stats()
+    return (before - after) * page_size
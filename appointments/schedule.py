@@ -0,0 +1,111 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils.timezone import localtime, make_aware, now
+
+from .models import AvailabilitySlot
+
+ALL_WEEKDAYS = tuple(range(7))
+SLOT_DURATIONS = (15, 30, 45, 60)
+
+
+def day_bounds(day):
+    """
+    Return the half-open ``[start, end)`` aware datetime range covering
+    ``day`` in the current timezone. Filtering with ``start__gte``/``start__lt``
+    keeps the ``start`` column bare so it can use an index, unlike
+    ``start__date`` which wraps it in a function.
+    """
+    start = make_aware(datetime.combine(day, time.min))
+    return start, make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def expand_weekly(start_date, end_date, day_start, day_end, weekdays=ALL_WEEKDAYS,
+                  slot_minutes=30, breaks=()):
+    """
+    Yield ``(start, end)`` aware datetimes for every slot of a recurring
+    weekly template between ``start_date`` and ``end_date`` (inclusive).
+
+    ``weekdays`` uses ``date.weekday()`` numbering (Monday is 0) and
+    ``breaks`` is a sequence of ``(time, time)`` pairs during which no slot
+    may run; slots resume as soon as a break ends.
+    """
+    if slot_minutes <= 0:
+        raise ValueError(f"slot_minutes must be positive, got {slot_minutes}")
+    step = timedelta(minutes=slot_minutes)
+    weekdays = set(weekdays)
+    day = start_date
+
+    while day <= end_date:
+        if day.weekday() in weekdays:
+            current = make_aware(datetime.combine(day, day_start))
+            end_dt = make_aware(datetime.combine(day, day_end))
+            day_breaks = sorted(
+                (make_aware(datetime.combine(day, b_start)), make_aware(datetime.combine(day, b_end)))
+                for b_start, b_end in breaks
+            )
+
+            while current + step <= end_dt:
+                slot_end = current + step
+                clash = next((b for b in day_breaks if current < b[1] and slot_end > b[0]), None)
+                if clash:
+                    current = clash[1]
+                    continue
+                yield current, slot_end
+                current = slot_end
+
+        day += timedelta(days=1)
+
+
+def generate_slots(doctor, start_date, end_date, day_start, day_end, weekdays=ALL_WEEKDAYS,
+                   slot_minutes=30, breaks=()):
+    """
+    Create the missing future slots for a weekly template.
+
+    Existing slots in the range are fetched with one query and the rest are
+    inserted with a single ``bulk_create``; ``ignore_conflicts`` relies on the
+    ``(doctor, start, end)`` unique constraint to absorb concurrent writers.
+    Returns the list of slots that were not already present.
+    """
+    current_time = now()
+    wanted = [
+        (start, end)
+        for start, end in expand_weekly(
+            start_date, end_date, day_start, day_end,
+            weekdays=weekdays, slot_minutes=slot_minutes, breaks=breaks,
+        )
+        if start > current_time
+    ]
+    if not wanted:
+        return []
+
+    existing = set(
+        AvailabilitySlot.objects.filter(
+            doctor=doctor,
+            start__gte=wanted[0][0],
+            start__lt=wanted[-1][1],
+        ).values_list("start", "end")
+    )
+
+    missing = [
+        AvailabilitySlot(doctor=doctor, start=start, end=end)
+        for start, end in wanted
+        if (start, end) not in existing
+    ]
+    # Imported here: both modules build on day_bounds() above.
+    from .availability import invalidate_on_commit
+    from .summary import refresh_days
+
+    with transaction.atomic():
+        AvailabilitySlot.objects.bulk_create(missing, ignore_conflicts=True)
+        if missing:
+            refresh_days(
+                doctor.pk,
+                localtime(missing[0].start).date(),
+                localtime(missing[-1].start).date(),
+            )
+
+        # bulk_create skips post_save, so invalidate cached availability here.
+        invalidate_on_commit(doctor.pk)
+
+    return missing
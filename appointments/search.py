@@ -0,0 +1,127 @@
+"""
+Free-slot search across doctors.
+
+``earliest_free_slots`` answers "any cardiologist tomorrow morning". The
+matching doctors are resolved once, then slots are read day block by day
+block (1, 1, 2, 4, ... days) with one indexed query each, stopping as soon
+as ``limit`` results are found. A bounded block keeps each query's scan and
+sort small: a single query over a two-week range has to sort every match
+before it can apply the limit. The time-of-day window is expanded into one
+``start`` range per day, so no function is applied to the indexed column.
+"""
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils.timezone import make_aware, now
+
+from users.models import Profile
+
+from .models import AvailabilitySlot
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_SEARCH_DAYS = 31
+
+
+def window_ranges(first_day, last_day, after, before=None):
+    """
+    Yield aware ``(start, end)`` ranges covering ``after``..``before`` local
+    time on every day from ``first_day`` to ``last_day``. ``before=None``
+    means until midnight.
+    """
+    day = first_day
+    while day <= last_day:
+        end_day = day if before else day + timedelta(days=1)
+        yield (
+            make_aware(datetime.combine(day, after)),
+            make_aware(datetime.combine(end_day, before or datetime.min.time())),
+        )
+        day += timedelta(days=1)
+
+
+def day_blocks(first_day, last_day):
+    """Split ``first_day``..``last_day`` into blocks of 1, 1, 2, 4, ... days."""
+    day, size = first_day, 1
+    while day <= last_day:
+        end = min(day + timedelta(days=size - 1), last_day)
+        yield day, end
+        day = end + timedelta(days=1)
+        if day > first_day + timedelta(days=1):
+            size *= 2
+
+
+def doctors_query(specialization):
+    doctors = Profile.objects.filter(role="doctor")
+    if specialization:
+        doctors = doctors.filter(specialization__iexact=specialization)
+    return doctors.values_list("user_id", flat=True)
+
+
+def search_query(first_day, last_day, after, before, doctor_ids, limit):
+    """
+    Free, future slots of ``doctor_ids`` (``None`` for every doctor) inside
+    the window, earliest first.
+    """
+    ranges = list(window_ranges(first_day, last_day, after, before))
+    window = Q()
+    for start, end in ranges:
+        window |= Q(start__gte=start, start__lt=end)
+
+    # The outer bounds give the index scan both ends; the per-day ranges
+    # then trim it to the time-of-day window.
+    slots = AvailabilitySlot.objects.filter(
+        window, booked=False, start__gt=now(), start__gte=ranges[0][0], start__lt=ranges[-1][1],
+    )
+    if doctor_ids is None:
+        slots = slots.filter(doctor__profile__role="doctor")
+    else:
+        slots = slots.filter(doctor_id__in=doctor_ids)
+
+    return (
+        slots.order_by("start", "id")
+        .values_list("id", "start", "end", "doctor_id", "doctor__username", "doctor__profile__specialization")
+        [:limit]
+    )
+
+
+def _row(row):
+    pk, start, end, doctor_id, username, specialization = row
+    return {
+        "id": pk,
+        "start": start,
+        "end": end,
+        "doctor": {"id": doctor_id, "username": username, "specialization": specialization},
+    }
+
+
+def earliest_free_slots(first_day, last_day, after, before=None, specialization="", limit=SEARCH_LIMIT):
+    """
+    The ``limit`` earliest free, future slots starting inside the daily
+    ``after``..``before`` window between ``first_day`` and ``last_day``,
+    across every doctor (optionally only those whose specialization matches
+    case-insensitively).
+    """
+    doctor_ids = list(doctors_query(specialization)) if specialization else None
+    if doctor_ids == []:
+        return []
+
+    results = []
+    for block_start, block_end in day_blocks(first_day, last_day):
+        results += map(_row, search_query(block_start, block_end, after, before, doctor_ids, limit - len(results)))
+        if len(results) >= limit:
+            break
+    return results
+
+
+async def aearliest_free_slots(first_day, last_day, after, before=None, specialization="", limit=SEARCH_LIMIT):
+    doctor_ids = [pk async for pk in doctors_query(specialization)] if specialization else None
+    if doctor_ids == []:
+        return []
+
+    results = []
+    for block_start, block_end in day_blocks(first_day, last_day):
+        query = search_query(block_start, block_end, after, before, doctor_ids, limit - len(results))
+        results += [_row(r) async for r in query]
+        if len(results) >= limit:
+            break
+    return results
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from users.models import Profile
+from .models import AvailabilitySlot, Booking
+from . import ics, summary
+from .availability import invalidate_on_commit, invalidate_roster_on_commit
+
+@receiver(pre_save, sender=AvailabilitySlot)
+def slot_saving(sender, instance, **kwargs):
+    # An edit may move the slot to another day; that day needs a recount too.
+    instance._previous_start = None
+    if not instance._state.adding:
+        instance._previous_start = sender.objects.filter(pk=instance.pk).values_list("start", flat=True).first()
+
+
+@receiver(post_save, sender=AvailabilitySlot)
+@receiver(post_delete, sender=AvailabilitySlot)
+def slot_changed(sender, instance, **kwargs):
+    invalidate_on_commit(instance.doctor_id)
+    summary.refresh_slot_days(instance.doctor_id, instance.start, getattr(instance, "_previous_start", None))
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    invalidate_on_commit(instance.slot.doctor_id)
+    ics.invalidate_on_commit(instance.slot.doctor_id, instance.patient_id)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_roster_on_commit()
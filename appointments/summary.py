@@ -0,0 +1,99 @@
+"""
+Incrementally maintained per-doctor day summaries (``DayAvailability``).
+
+Booking and cancellation adjust the counters with a single ``UPDATE``;
+slot generation recomputes the affected days with one grouped query, and
+slots saved or deleted one at a time (admin, ``objects.create``) recount
+their day from the model signals. An adjustment that finds no row, or
+would take a counter below zero, recounts the day instead. Callers run
+these inside the same transaction as the slot change.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils.timezone import get_current_timezone, localdate, localtime
+
+from .models import AvailabilitySlot, DayAvailability
+from .schedule import day_bounds
+
+PICKER_DAYS = 30
+
+
+def record_booking(slot):
+    day = localtime(slot.start).date()
+    updated = DayAvailability.objects.filter(
+        doctor_id=slot.doctor_id, date=day, free_count__gt=0,
+    ).update(free_count=F("free_count") - 1, booked_count=F("booked_count") + 1)
+    if not updated:
+        refresh_days(slot.doctor_id, day, day)
+
+
+def record_cancellation(slot):
+    day = localtime(slot.start).date()
+    updated = DayAvailability.objects.filter(
+        doctor_id=slot.doctor_id, date=day, booked_count__gt=0,
+    ).update(free_count=F("free_count") + 1, booked_count=F("booked_count") - 1)
+    if not updated:
+        refresh_days(slot.doctor_id, day, day)
+
+
+def refresh_slot_days(doctor_id, *starts):
+    """Recount the days the given slot start times fall on."""
+    for day in {localtime(start).date() for start in starts if start is not None}:
+        refresh_days(doctor_id, day, day)
+
+
+def refresh_days(doctor_id, first_day, last_day):
+    """Recompute the summary rows for ``first_day``..``last_day`` from the slots."""
+    range_start, _ = day_bounds(first_day)
+    _, range_end = day_bounds(last_day)
+
+    counts = (
+        AvailabilitySlot.objects.filter(doctor_id=doctor_id, start__gte=range_start, start__lt=range_end)
+        .annotate(day=TruncDate("start", tzinfo=get_current_timezone()))
+        .values("day")
+        .annotate(
+            free=Count("id", filter=Q(booked=False)),
+            booked=Count("id", filter=Q(booked=True)),
+        )
+        .order_by()
+    )
+    rows = [
+        DayAvailability(doctor_id=doctor_id, date=c["day"], free_count=c["free"], booked_count=c["booked"])
+        for c in counts
+    ]
+
+    DayAvailability.objects.filter(
+        doctor_id=doctor_id, date__gte=first_day, date__lte=last_day,
+    ).exclude(date__in=[r.date for r in rows]).delete()
+
+    DayAvailability.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["doctor", "date"],
+        update_fields=["free_count", "booked_count"],
+    )
+
+
+def picker_days(doctor_id, only_free=True, days=PICKER_DAYS):
+    """Summary rows for the date picker, from today over the next ``days`` days."""
+    return list(_picker_query(doctor_id, only_free, days))
+
+
+async def apicker_days(doctor_id, only_free=True, days=PICKER_DAYS):
+    return [row async for row in _picker_query(doctor_id, only_free, days)]
+
+
+def _picker_query(doctor_id, only_free, days):
+    today = localdate()
+    rows = DayAvailability.objects.filter(
+        doctor_id=doctor_id,
+        date__gte=today,
+        date__lt=today + timedelta(days=days),
+    ).only("date", "free_count", "booked_count")
+
+    if only_free:
+        rows = rows.filter(free_count__gt=0)
+
+    return rows
@@ -1,3 +1,1094 @@
-from django.test import TestCase
+import asyncio
+import cProfile
+import csv
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, time, timedelta, timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import localdate, localtime, now
+
+from hms import metrics
+
+from . import availability, ics, live, reminders
+from .booking import SlotUnavailable, claim_slot, release_booking
+from .models import (
+    ArchivedBooking, AvailabilitySlot, Booking, BookingReminder, CancelledBooking, DayAvailability, EmailOutbox,
+    WaitlistEntry,
+)
+from .outbox import drain
+from .schedule import day_bounds, expand_weekly, generate_slots
+from .utils import appointment_messages
+
+
+class RecordingBroker(live.LocalBroker):
+
+    published = []
+
+    def publish(self, channel, event):
+        self.published.append((channel, event))
+        return super().publish(channel, event)
+
+
+def setUpModule():
+    # Keep the per-request structured log lines out of the test output.
+    logging.getLogger("hms.requests").setLevel(logging.WARNING)
+
+
+def make_user(username, role):
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="pw")
+    user.profile.role = role
+    user.profile.save()
+    return user
+
+
+class SlotFixtureMixin:
+    """A doctor with free slots from tomorrow and one patient, on an empty cache."""
+
+    slot_hours = (time(9), time(10))
+    slot_days = 1
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.doctor = make_user("doc", "doctor")
+        self.patient = make_user("pat", "patient")
+        self.day = localdate() + timedelta(days=1)
+        generate_slots(self.doctor, self.day, self.day + timedelta(days=self.slot_days - 1), *self.slot_hours)
+
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_user("doc", "doctor")
+        self.patient = make_user("pat", "patient")
+        start = now() + timedelta(days=1)
+        self.slot = AvailabilitySlot.objects.create(
+            doctor=self.doctor, start=start, end=start + timedelta(minutes=30)
+        )
+
+    def test_booking_queues_emails_without_sending(self):
+        self.client.force_login(self.patient)
+        self.client.get(reverse("appointments:book_slot", args=[self.slot.pk]))
+
+        self.assertTrue(Booking.objects.filter(slot=self.slot).exists())
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            sorted(EmailOutbox.objects.values_list("to", flat=True)),
+            ["doc@example.com", "pat@example.com"],
+        )
+
+    def test_emails_have_text_and_html_parts(self):
+        message = appointment_messages(self.doctor, self.patient, self.slot)[0]
+
+        self.assertIn("Dr. doc", message["body"])
+        self.assertIn("<h2>", message["html_body"])
+        self.assertIn(f"&dates={self.slot.start.astimezone(timezone.utc):%Y%m%dT%H%M%SZ}/", message["body"])
+
+    def test_send_outbox_delivers_pending_messages(self):
+        self.client.force_login(self.patient)
+        self.client.get(reverse("appointments:book_slot", args=[self.slot.pk]))
+
+        call_command("send_outbox", stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.SENT).exists())
+
+    @override_settings(EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend", EMAIL_PORT=1)
+    def test_failed_delivery_is_retried_then_given_up(self):
+        EmailOutbox.objects.create(subject="s", to="x@example.com", html_body="<p>x</p>")
+
+        self.assertEqual(drain(max_attempts=2), (0, 1, 0))
+        row = EmailOutbox.objects.get()
+        self.assertEqual(row.status, EmailOutbox.PENDING)
+        self.assertGreater(row.next_attempt_at, now())
+
+        EmailOutbox.objects.update(next_attempt_at=now())
+        self.assertEqual(drain(max_attempts=2), (0, 0, 1))
+        self.assertEqual(EmailOutbox.objects.get().status, EmailOutbox.FAILED)
+
+
+class ScheduleTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_user("doc", "doctor")
+        self.first_day = localdate() + timedelta(days=1)
+
+    def test_expand_weekly_skips_breaks_and_other_weekdays(self):
+        monday = self.first_day + timedelta(days=(7 - self.first_day.weekday()) % 7)
+        slots = list(expand_weekly(
+            monday, monday + timedelta(days=6), time(9), time(12),
+            weekdays=[0], slot_minutes=60, breaks=[(time(10), time(10, 30))],
+        ))
+
+        self.assertEqual(
+            [(s.hour, s.minute) for s, _ in slots],
+            [(9, 0), (10, 30)],
+        )
+
+    def test_expand_weekly_rejects_non_positive_lengths(self):
+        for minutes in (0, -30):
+            with self.assertRaises(ValueError):
+                list(expand_weekly(self.first_day, self.first_day, time(9), time(12), slot_minutes=minutes))
+
+    def test_generate_slots_uses_constant_queries_and_is_idempotent(self):
+        until = self.first_day + timedelta(days=59)
+
+        with CaptureQueriesContext(connection) as ctx:
+            created = generate_slots(self.doctor, self.first_day, until, time(0), time(23, 45), slot_minutes=15)
+
+        self.assertEqual(len(created), 60 * 95)
+        selects = [q for q in ctx.captured_queries if q["sql"].startswith("SELECT")]
+        # One range query to diff existing slots, one grouped day summary.
+        self.assertEqual(len(selects), 2)
+        # Only the backend's parameter limit splits the insert into batches.
+        self.assertLess(len(ctx.captured_queries), len(created) // 100)
+        self.assertEqual(AvailabilitySlot.objects.count(), 60 * 95)
+        self.assertEqual(generate_slots(self.doctor, self.first_day, until, time(0), time(23, 45), slot_minutes=15), [])
+
+    def test_dashboard_post_creates_recurring_slots(self):
+        self.client.force_login(self.doctor)
+        self.client.post(reverse("appointments:doctor_dashboard"), {
+            "date": self.first_day.isoformat(),
+            "until_date": (self.first_day + timedelta(days=6)).isoformat(),
+            "start_time": "09:00",
+            "end_time": "11:00",
+            "duration": "30",
+        })
+
+        self.assertEqual(AvailabilitySlot.objects.filter(doctor=self.doctor).count(), 7 * 4)
+
+
+class QueryCountTests(SlotFixtureMixin, TestCase):
+    """Page query counts must not grow with the number of rows rendered."""
+
+    slot_hours = (time(8), time(18))
+
+    def book(self, count):
+        for slot in AvailabilitySlot.objects.filter(booked=False)[:count]:
+            slot.booked = True
+            slot.save()
+            Booking.objects.create(slot=slot, patient=self.patient)
+
+    def count_queries(self, user, url):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_my_bookings_is_constant(self):
+        url = reverse("appointments:my_bookings")
+        self.book(1)
+        baseline = {u: self.count_queries(u, url) for u in (self.doctor, self.patient)}
+
+        self.book(15)
+        for user, expected in baseline.items():
+            self.assertEqual(self.count_queries(user, url), expected)
+
+    def test_doctors_list_is_constant(self):
+        url = reverse("appointments:doctors_list") + f"?doctor_id={self.doctor.pk}&date={self.day}"
+        self.count_queries(self.patient, url)
+        baseline = self.count_queries(self.patient, url)
+
+        for i in range(10):
+            make_user(f"doc{i}", "doctor")
+        self.assertEqual(self.count_queries(self.patient, url), baseline)
+
+    def test_doctor_dashboard_is_constant(self):
+        url = reverse("appointments:doctor_dashboard")
+        # Compare cold renders: the date picker fragment is cached.
+        cache.clear()
+        baseline = self.count_queries(self.doctor, url)
+
+        generate_slots(self.doctor, self.day + timedelta(days=1), self.day + timedelta(days=3), time(8), time(18))
+        cache.clear()
+        self.assertEqual(self.count_queries(self.doctor, url), baseline)
+
+
+class PaginationTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_user("doc", "doctor")
+        self.day = localdate() + timedelta(days=1)
+        generate_slots(self.doctor, self.day, self.day + timedelta(days=2), time(0), time(23, 30))
+        self.client.force_login(self.doctor)
+
+    def test_json_pages_cover_every_slot_once(self):
+        url = reverse("appointments:doctor_slots_json")
+        seen = []
+        cursor = None
+
+        while True:
+            data = self.client.get(url, {"after": cursor} if cursor else {}).json()
+            seen.extend(r["id"] for r in data["results"])
+            cursor = data["next"]
+            if not cursor:
+                break
+
+        expected = list(AvailabilitySlot.objects.order_by("start", "id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse("appointments:doctor_slots_json"), {"after": "nope"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_streams_all_slots(self):
+        response = self.client.get(reverse("appointments:export_history"))
+
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), AvailabilitySlot.objects.count() + 1)
+
+
+class AvailabilityCacheTests(SlotFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        availability.reset_stats()
+
+    def test_repeat_reads_hit_the_cache(self):
+        first = availability.free_slots(self.doctor.pk, self.day)
+
+        with self.assertNumQueries(0):
+            second = availability.free_slots(self.doctor.pk, self.day)
+
+        self.assertEqual(first, second)
+        self.assertEqual(availability.stats()["hits"], 1)
+        self.assertEqual(availability.stats()["misses"], 1)
+
+    def test_booking_and_cancelling_invalidate(self):
+        slot = AvailabilitySlot.objects.first()
+        self.assertEqual(len(availability.free_slots(self.doctor.pk, self.day)), 2)
+
+        self.client.force_login(self.patient)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("appointments:book_slot", args=[slot.pk]))
+        self.assertEqual(len(availability.free_slots(self.doctor.pk, self.day)), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("appointments:cancel_booking", args=[slot.booking.pk]))
+        self.assertEqual(len(availability.free_slots(self.doctor.pk, self.day)), 2)
+
+
+class DaySummaryTests(SlotFixtureMixin, TestCase):
+
+    slot_hours = (time(9), time(11))
+    slot_days = 2
+
+    def counts(self, day):
+        row = DayAvailability.objects.get(doctor=self.doctor, date=day)
+        return row.free_count, row.booked_count
+
+    def test_generation_booking_and_cancellation_keep_counts(self):
+        self.assertEqual(self.counts(self.day), (4, 0))
+        slot = AvailabilitySlot.objects.filter(doctor=self.doctor).first()
+
+        self.client.force_login(self.patient)
+        self.client.get(reverse("appointments:book_slot", args=[slot.pk]))
+        self.assertEqual(self.counts(self.day), (3, 1))
+
+        self.client.get(reverse("appointments:cancel_booking", args=[slot.booking.pk]))
+        self.assertEqual(self.counts(self.day), (4, 0))
+
+    def test_single_slot_changes_recount_their_days(self):
+        later = self.day + timedelta(days=5)
+        start = day_bounds(later)[0] + timedelta(hours=9)
+        slot = AvailabilitySlot.objects.create(doctor=self.doctor, start=start, end=start + timedelta(minutes=30))
+        self.assertEqual(self.counts(later), (1, 0))
+
+        slot.start += timedelta(days=1)
+        slot.end += timedelta(days=1)
+        slot.save()
+        self.assertFalse(DayAvailability.objects.filter(doctor=self.doctor, date=later).exists())
+        self.assertEqual(self.counts(later + timedelta(days=1)), (1, 0))
+
+        slot.delete()
+        self.assertFalse(DayAvailability.objects.filter(doctor=self.doctor, date=later + timedelta(days=1)).exists())
+
+    def test_stale_counts_are_recounted_instead_of_underflowing(self):
+        slots = list(AvailabilitySlot.objects.filter(start__lt=day_bounds(self.day)[1]))
+        DayAvailability.objects.filter(doctor=self.doctor, date=self.day).update(free_count=0)
+
+        booking = claim_slot(slots[0].pk, self.patient)
+        self.assertEqual(self.counts(self.day), (3, 1))
+
+        DayAvailability.objects.filter(doctor=self.doctor, date=self.day).update(booked_count=0)
+        release_booking(booking)
+        self.assertEqual(self.counts(self.day), (4, 0))
+
+    def test_picker_marks_full_days(self):
+        AvailabilitySlot.objects.filter(start__gte=day_bounds(self.day)[1]).update(booked=True)
+        call_command("rebuild_day_summary", stdout=StringIO())
+
+        self.client.force_login(self.patient)
+        response = self.client.get(reverse("appointments:doctors_list"), {"doctor_id": self.doctor.pk})
+
+        # Full days stay listed so patients can join their waitlist.
+        self.assertEqual(
+            [(d.date, d.free_count) for d in response.context["available_dates"]],
+            [(self.day, 4), (self.day + timedelta(days=1), 0)],
+        )
+        self.assertContains(response, "(full)")
+
+
+class ClaimSlotTests(SlotFixtureMixin, TestCase):
+
+    slot_hours = (time(9), time(9, 30))
+
+    def setUp(self):
+        super().setUp()
+        self.other = make_user("pat2", "patient")
+        self.slot = AvailabilitySlot.objects.get(doctor=self.doctor)
+
+    def test_second_claim_loses(self):
+        claim_slot(self.slot.pk, self.patient)
+
+        with self.assertRaises(SlotUnavailable):
+            claim_slot(self.slot.pk, self.other)
+        self.assertEqual(Booking.objects.get().patient, self.patient)
+
+    def test_only_a_stray_booking_counts_as_taken(self):
+        Booking.objects.create(slot=self.slot, patient=self.other)
+        AvailabilitySlot.objects.filter(pk=self.slot.pk).update(booked=False)
+        with self.assertRaises(SlotUnavailable):
+            claim_slot(self.slot.pk, self.patient)
+
+        Booking.objects.all().delete()
+        with mock.patch("appointments.booking.queue_appointment_emails", side_effect=IntegrityError("outbox")):
+            with self.assertRaisesMessage(IntegrityError, "outbox"):
+                claim_slot(self.slot.pk, self.patient)
+        self.assertFalse(AvailabilitySlot.objects.get(pk=self.slot.pk).booked)
+
+    def test_view_maps_outcomes(self):
+        self.client.force_login(self.patient)
+        url = reverse("appointments:book_slot", args=[self.slot.pk])
+
+        self.assertRedirects(self.client.get(url), reverse("appointments:my_bookings"))
+        self.assertEqual(self.client.get(url).status_code, 409)
+        self.assertEqual(
+            self.client.get(reverse("appointments:book_slot", args=[self.slot.pk + 100])).status_code, 404
+        )
+
+
+class ApiTests(SlotFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.patient)
+        self.slots_url = reverse("appointments:api_doctor_slots", args=[self.doctor.pk])
+
+    def test_unchanged_availability_returns_304(self):
+        first = self.client.get(self.slots_url, {"date": self.day})
+        self.assertEqual(len(first.json()["results"]), 2)
+
+        again = self.client.get(self.slots_url, {"date": self.day}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_booking_changes_etag(self):
+        first = self.client.get(self.slots_url, {"date": self.day})
+        slot_id = first.json()["results"][0]["id"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("appointments:api_book", args=[slot_id]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.post(reverse("appointments:api_book", args=[slot_id])).status_code, 409)
+
+        again = self.client.get(self.slots_url, {"date": self.day}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(len(again.json()["results"]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("appointments:api_cancel", args=[response.json()["id"]]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("appointments:api_doctors")).status_code, 401)
+
+
+class AsyncViewTests(SlotFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        claim_slot(AvailabilitySlot.objects.first().pk, self.patient)
+
+    async def test_read_pages_render_under_asgi(self):
+        await self.async_client.aforce_login(self.patient)
+
+        response = await self.async_client.get(
+            reverse("appointments:doctors_list"), {"doctor_id": self.doctor.pk, "date": self.day}
+        )
+        self.assertEqual(len(response.context["slots"]), 1)
+
+        response = await self.async_client.get(reverse("appointments:my_bookings"))
+        self.assertContains(response, "doc")
+
+        response = await self.async_client.get(reverse("appointments:api_doctor_slots", args=[self.doctor.pk]),
+                                               {"date": self.day})
+        self.assertEqual(response.status_code, 200)
+
+
+class MetricsTests(SlotFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_request_is_logged_and_exported(self):
+        self.client.force_login(self.patient)
+        url = reverse("appointments:doctors_list")
+
+        with self.assertLogs("hms.requests", level="INFO") as logs:
+            self.client.get(url, {"doctor_id": self.doctor.pk, "date": self.day})
+
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line["view"], "appointments:doctors_list")
+        self.assertGreater(line["db_queries"], 0)
+        self.assertGreater(line["template_ms"], 0)
+        # The doctor dropdown, the date picker and the slot list.
+        self.assertEqual(line["cache_misses"], 3)
+
+        body = self.client.get(reverse("metrics"), headers={"authorization": "Bearer secret"}).content.decode()
+        self.assertIn('hms_requests_total{view="appointments:doctors_list",status="200"} 1', body)
+        self.assertIn('hms_cache_misses_total{view="appointments:doctors_list"} 3', body)
+
+        # Each family is one block: its TYPE line followed by all its samples.
+        families = [line.split()[2] for line in body.splitlines() if line.startswith("# TYPE")]
+        self.assertEqual(len(families), len(set(families)))
+        for line in body.splitlines():
+            if not line.startswith("#"):
+                family = line.split("{")[0].removesuffix("_bucket").removesuffix("_sum").removesuffix("_count")
+                self.assertEqual(family, current)
+            else:
+                current = line.split()[2]
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_need_the_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        response = self.client.get(reverse("metrics"), headers={"authorization": "Bearer wrong"})
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_metrics_without_a_token_are_staff_only(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+        self.patient.is_staff = True
+        self.patient.save()
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+    @override_settings(METRICS_PROFILE_SAMPLE_RATE=1.0, METRICS_SLOW_REQUEST_MS=10 ** 6)
+    async def test_concurrent_sampled_requests_share_one_profiler(self):
+        await sync_to_async(self.async_client.force_login)(self.patient)
+        url = reverse("appointments:api_doctor_slots", args=[self.doctor.pk])
+
+        with mock.patch("hms.metrics.cProfile.Profile", wraps=cProfile.Profile) as profile:
+            responses = await asyncio.gather(*(self.async_client.get(url, {"date": self.day}) for _ in range(2)))
+
+        self.assertEqual([r.status_code for r in responses], [200, 200])
+        self.assertEqual(profile.call_count, 1)
+
+
+class ReminderTests(SlotFixtureMixin, TestCase):
+
+    slot_hours = (time(9), time(11))
+
+    def setUp(self):
+        super().setUp()
+        for slot in AvailabilitySlot.objects.all()[:3]:
+            claim_slot(slot.pk, self.patient)
+
+    def test_reminders_are_grouped_and_idempotent(self):
+        call_command("send_reminders", hours=72, stdout=StringIO())
+
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["doc@example.com", "pat@example.com"])
+        self.assertEqual(BookingReminder.objects.count(), 6)
+
+        call_command("send_reminders", hours=72, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_delivered_chunks_are_recorded_before_a_crash(self):
+        generate_slots(self.doctor, self.day, self.day, time(11), time(13))
+        for i, slot in enumerate(AvailabilitySlot.objects.filter(booked=False)[:3]):
+            claim_slot(slot.pk, make_user(f"pat{i}", "patient"))
+        build = reminders.build_digest
+        calls = []
+
+        def crash_on_third(recipient, bookings):
+            calls.append(recipient)
+            if len(calls) == 3:
+                raise RuntimeError("crash")
+            return build(recipient, bookings)
+
+        with mock.patch("appointments.reminders.build_digest", crash_on_third):
+            with self.assertRaises(RuntimeError):
+                reminders.dispatch(window=timedelta(hours=72), workers=1, chunk_size=1)
+
+        # The first chunk was confirmed and recorded; the second was in flight.
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(BookingReminder.objects.count(), 3)
+
+        call_command("send_reminders", hours=72, stdout=StringIO())
+        self.assertEqual(BookingReminder.objects.count(), 2 * 6)
+        self.assertEqual(len(mail.outbox), 2 + 4)
+
+    def test_pages_cover_every_due_booking(self):
+        generate_slots(self.doctor, self.day, self.day, time(11), time(13))
+        for i, slot in enumerate(AvailabilitySlot.objects.filter(booked=False)):
+            claim_slot(slot.pk, make_user(f"pat{i}", "patient"))
+
+        with mock.patch("appointments.reminders.ITERATOR_CHUNK_SIZE", 2):
+            stats = reminders.dispatch(window=timedelta(hours=72), chunk_size=2)
+
+        self.assertEqual(stats["bookings"], 2 * 8)
+        self.assertEqual(stats["messages"], 6 + 1)
+        self.assertEqual(BookingReminder.objects.count(), 2 * 8)
+
+
+class ScheduleImportTests(TestCase):
+
+    def test_templates_generate_slots_and_export(self):
+        doctor = make_user("doc", "doctor")
+        make_user("pat", "patient")
+        monday = localdate() + timedelta(days=7 - localdate().weekday())
+        rows = [
+            {"doctor": "doc", "start_date": monday.isoformat(), "end_date": (monday + timedelta(days=6)).isoformat(),
+             "day_start": "09:00", "day_end": "12:00", "weekdays": "0,2", "slot_minutes": "60",
+             "breaks": "10:00-11:00"},
+            {"doctor": "pat", "start_date": monday.isoformat(), "end_date": monday.isoformat(),
+             "day_start": "09:00", "day_end": "12:00"},
+            {"doctor": "doc", "start_date": "not a date", "end_date": "", "day_start": "", "day_end": ""},
+            {"doctor": "doc", "start_date": monday.isoformat(), "end_date": monday.isoformat(),
+             "day_start": "09:00", "day_end": "12:00", "slot_minutes": "0"},
+            {"doctor": "doc", "start_date": monday.isoformat(), "end_date": monday.isoformat(),
+             "day_start": "09:00", "day_end": "12:00", "slot_minutes": "-30"},
+        ]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "schedules.csv")
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+
+            out = StringIO()
+            call_command("import_schedules", path, stdout=out, stderr=StringIO())
+            self.assertIn("Imported 1 templates (4 slots)", out.getvalue())
+            self.assertIn("4 skipped", out.getvalue())
+
+            starts = sorted(AvailabilitySlot.objects.filter(doctor=doctor).values_list("start", flat=True))
+            self.assertEqual([s.hour for s in map(localtime, starts)], [9, 11, 9, 11])
+            self.assertEqual(DayAvailability.objects.get(doctor=doctor, date=monday).free_count, 2)
+
+            export = os.path.join(tmp, "slots.jsonl")
+            call_command("export_data", "slots", output=export, stdout=StringIO())
+            with open(export) as f:
+                exported = [json.loads(line) for line in f]
+
+        self.assertEqual(len(exported), 4)
+        self.assertEqual(exported[0]["doctor"], "doc")
+        self.assertFalse(exported[0]["booked"])
+
+
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_user("doc", "doctor")
+        self.patient = make_user("pat", "patient")
+
+        def slot(days_ago, booked=False):
+            start = now() - timedelta(days=days_ago)
+            s = AvailabilitySlot.objects.create(
+                doctor=self.doctor, start=start, end=start + timedelta(minutes=30), booked=booked,
+            )
+            if booked:
+                booking = Booking.objects.create(slot=s, patient=self.patient, notes="follow-up")
+                BookingReminder.objects.create(booking=booking, recipient=BookingReminder.PATIENT)
+            return s
+
+        self.old_free = [slot(100), slot(95), slot(91)]
+        self.old_booked = slot(120, booked=True)
+        self.recent = [slot(10), slot(5, booked=True)]
+        self.future = slot(-3)
+
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command("prune_slots", days=90, dry_run=True, stdout=out)
+        self.assertIn("would delete 3 unbooked slots and archive 1 bookings", out.getvalue())
+        self.assertEqual(AvailabilitySlot.objects.count(), 7)
+
+    def test_prune_and_archive(self):
+        out = StringIO()
+        call_command("prune_slots", days=90, batch_size=2, no_vacuum=True, stdout=out)
+        self.assertIn("Deleted 3 unbooked slots, archived 1 bookings", out.getvalue())
+
+        remaining = set(AvailabilitySlot.objects.values_list("pk", flat=True))
+        self.assertEqual(remaining, {s.pk for s in self.recent + [self.future]})
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(BookingReminder.objects.count(), 1)
+
+        archived = ArchivedBooking.objects.get()
+        self.assertEqual(
+            (archived.slot_id, archived.doctor, archived.patient, archived.start, archived.notes),
+            (self.old_booked.pk, self.doctor, self.patient, self.old_booked.start, "follow-up"),
+        )
+
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse("appointments:export_history"))
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1 + 4)
+        self.assertTrue(lines[1].startswith(f"{self.old_booked.pk},"))
+        self.assertIn(",True,", lines[1])
+        self.assertIn(",pat,pat@example.com,", lines[1])
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.day = localdate() + timedelta(days=1)
+        self.cardio = [make_user("card1", "doctor"), make_user("card2", "doctor")]
+        self.derm = make_user("derm", "doctor")
+        for i, doctor in enumerate(self.cardio + [self.derm]):
+            doctor.profile.specialization = "Dermatology" if doctor == self.derm else "Cardiology"
+            doctor.profile.save()
+            generate_slots(doctor, self.day, self.day + timedelta(days=3), time(9 + i), time(19))
+        self.patient = make_user("pat", "patient")
+        self.client.force_login(self.patient)
+        self.url = reverse("appointments:api_search_slots")
+
+    def search(self, **params):
+        return self.client.get(self.url, {"from": self.day.isoformat(), **params})
+
+    def test_earliest_slots_across_matching_doctors(self):
+        response = self.search(specialization="cardiology", after="10:00", before="11:00", limit=3)
+        results = response.json()["results"]
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual([r["doctor"]["username"] for r in results], ["card1", "card2", "card1"])
+        self.assertTrue(all(localtime(datetime.fromisoformat(r["start"])).hour == 10 for r in results))
+
+    def test_results_span_days_in_order(self):
+        response = self.search(**{"to": (self.day + timedelta(days=3)).isoformat(), "after": "18:00", "limit": 12})
+        starts = [r["start"] for r in response.json()["results"]]
+
+        self.assertEqual(len(starts), 12)
+        self.assertEqual(starts, sorted(starts))
+        self.assertEqual(len({s[:10] for s in starts}), 2)
+
+    def test_unknown_specialization_and_bad_input(self):
+        self.assertEqual(self.search(specialization="podiatry").json()["results"], [])
+        self.assertEqual(self.search(after="12:00", before="09:00").status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"from": "soon"}).status_code, 400)
+        self.assertEqual(self.search(to=(self.day + timedelta(days=60)).isoformat()).status_code, 400)
+
+
+class WaitlistTests(SlotFixtureMixin, TestCase):
+
+    slot_hours = (time(9), time(9, 30))
+
+    def setUp(self):
+        super().setUp()
+        self.second = make_user("pat2", "patient")
+        self.slot = AvailabilitySlot.objects.get(doctor=self.doctor)
+        self.booking = claim_slot(self.slot.pk, self.patient)
+
+    def join(self, patient):
+        self.client.force_login(patient)
+        return self.client.post(
+            reverse("appointments:join_waitlist"), {"doctor_id": self.doctor.pk, "date": self.day.isoformat()},
+        )
+
+    def test_full_day_offers_waitlist(self):
+        self.client.force_login(self.second)
+        response = self.client.get(
+            reverse("appointments:doctors_list"), {"doctor_id": self.doctor.pk, "date": self.day.isoformat()},
+        )
+        self.assertContains(response, "Join Waitlist")
+
+        self.join(self.second)
+        self.join(self.second)
+        self.assertEqual(WaitlistEntry.objects.filter(patient=self.second).count(), 1)
+
+        response = self.client.get(reverse("appointments:my_bookings"))
+        self.assertContains(response, "Leave")
+
+    def test_cancellation_hands_slot_to_first_waiting_patient(self):
+        third = make_user("pat3", "patient")
+        self.join(self.second)
+        self.join(third)
+        mail_count = EmailOutbox.objects.count()
+
+        self.client.force_login(self.patient)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("appointments:cancel_booking", args=[self.booking.pk]))
+
+        booking = Booking.objects.get(slot=self.slot)
+        self.assertEqual(booking.patient, self.second)
+        self.slot.refresh_from_db()
+        self.assertTrue(self.slot.booked)
+        self.assertEqual(list(WaitlistEntry.objects.values_list("patient__username", flat=True)), ["pat3"])
+        self.assertEqual(DayAvailability.objects.get(doctor=self.doctor, date=self.day).free_count, 0)
+        self.assertEqual(
+            sorted(EmailOutbox.objects.order_by("id")[mail_count:].values_list("to", flat=True)),
+            ["doc@example.com", "doc@example.com", "pat2@example.com", "pat@example.com"],
+        )
+
+    def test_cancellation_without_waitlist_frees_slot(self):
+        booking_id = self.booking.pk
+        self.assertIsNone(release_booking(self.booking))
+        self.slot.refresh_from_db()
+        self.assertFalse(self.slot.booked)
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(DayAvailability.objects.get(doctor=self.doctor, date=self.day).free_count, 1)
+
+        stale = Booking(pk=booking_id, slot=self.slot, patient=self.patient)
+        self.assertIsNone(release_booking(stale))
+        self.assertEqual(DayAvailability.objects.get(doctor=self.doctor, date=self.day).free_count, 1)
+
+    def test_booking_removes_own_waitlist_entry(self):
+        release_booking(self.booking)
+        WaitlistEntry.objects.create(doctor=self.doctor, patient=self.second, date=self.day)
+        claim_slot(self.slot.pk, self.second)
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_only_patients_without_a_slot_can_wait_for_a_full_day(self):
+        self.client.force_login(self.patient)
+        response = self.client.get(
+            reverse("appointments:doctors_list"), {"doctor_id": self.doctor.pk, "date": self.day.isoformat()},
+        )
+        self.assertNotContains(response, "Join Waitlist")
+        self.join(self.patient)
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_booking(self.booking)
+        self.join(self.second)
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_hand_off_skips_patients_already_booked_that_day(self):
+        generate_slots(self.doctor, self.day, self.day, time(9, 30), time(10))
+        other = AvailabilitySlot.objects.get(doctor=self.doctor, booked=False)
+        claim_slot(other.pk, self.second)
+        third = make_user("pat3", "patient")
+        # An entry left over from before the patient booked.
+        WaitlistEntry.objects.create(doctor=self.doctor, patient=self.second, date=self.day)
+        WaitlistEntry.objects.create(doctor=self.doctor, patient=third, date=self.day)
+
+        successor = release_booking(self.booking)
+
+        self.assertEqual(successor.patient, third)
+        self.assertEqual(Booking.objects.filter(patient=self.second).count(), 1)
+
+
+class FragmentCacheTests(SlotFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.patient)
+        self.url = reverse("appointments:doctors_list")
+
+    def test_cached_pickers_skip_their_queries(self):
+        params = {"doctor_id": self.doctor.pk, "date": self.day.isoformat()}
+        self.client.get(self.url, params)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, params)
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertNotIn("appointments_dayavailability", sql)
+        self.assertNotIn("ORDER BY \"auth_user\".\"username\"", sql)
+        self.assertContains(response, f'{self.day:%Y-%m-%d} (2 free)')
+        self.assertContains(response, "Dr. doc")
+
+    def test_changes_refresh_the_fragments(self):
+        self.client.get(self.url, {"doctor_id": self.doctor.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_slot(AvailabilitySlot.objects.first().pk, self.patient)
+            make_user("newdoc", "doctor")
+
+        response = self.client.get(self.url, {"doctor_id": self.doctor.pk})
+        self.assertContains(response, f'{self.day:%Y-%m-%d} (1 free)')
+        self.assertContains(response, "Dr. newdoc")
+
+    def test_garbage_dates_share_one_fragment(self):
+        self.client.get(self.url, {"doctor_id": self.doctor.pk})
+
+        for junk in ("nope", "2020-13-40", "x" * 200):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(self.url, {"doctor_id": self.doctor.pk, "date": junk})
+            sql = " ".join(q["sql"] for q in ctx.captured_queries)
+            self.assertNotIn("appointments_dayavailability", sql)
+
+
+@override_settings(LIVE_EVENTS_BROKER="appointments.tests.RecordingBroker")
+class LiveEventsTests(SlotFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        live.get_broker.cache_clear()
+        self.addCleanup(live.get_broker.cache_clear)
+        RecordingBroker.published = []
+        self.url = reverse("appointments:api_slot_events", args=[self.doctor.pk])
+
+    async def test_slow_reader_is_resynced_instead_of_blocking(self):
+        broker = live.LocalBroker()
+        fast = broker.subscribe("c", 8)
+        slow = broker.subscribe("c", 2)
+
+        for i in range(3):
+            self.assertEqual(broker.publish("c", {"type": "booked", "id": i}), 2)
+        await asyncio.sleep(0)
+
+        self.assertEqual([(await fast.get())["id"] for _ in range(3)], [0, 1, 2])
+        self.assertEqual((await slow.get())["type"], live.RESYNC)
+        self.assertTrue(slow.queue.empty())
+
+        fast.close()
+        slow.close()
+        self.assertEqual(broker.publish("c", {"type": "booked", "id": 3}), 0)
+
+    def test_booking_and_cancellation_publish_after_commit(self):
+        slot = AvailabilitySlot.objects.order_by("start").first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = claim_slot(slot.pk, self.patient)
+            self.assertEqual(RecordingBroker.published, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            release_booking(booking)
+
+        channel = live.channel_for(self.doctor.pk, self.day)
+        self.assertEqual(
+            [(c, e["type"], e["id"]) for c, e in RecordingBroker.published],
+            [(channel, "booked", slot.pk), (channel, "freed", slot.pk)],
+        )
+
+    def test_streams_release_their_request_thread(self):
+        async def request():
+            async with ThreadSensitiveContext():
+                worker = await sync_to_async(threading.current_thread)()
+                await live.release_request_thread()
+                await asyncio.to_thread(worker.join, 5)
+                return worker
+
+        self.assertFalse(asyncio.run(request()).is_alive())
+
+    @override_settings(LIVE_EVENTS_MAX_CONNECTIONS=0)
+    async def test_connection_limit(self):
+        await self.async_client.aforce_login(self.patient)
+        response = await self.async_client.get(self.url, {"date": self.day})
+        self.assertEqual(response.status_code, 503)
+
+    def test_wsgi_requests_are_told_not_to_reconnect(self):
+        self.client.force_login(self.patient)
+        response = self.client.get(self.url, {"date": self.day})
+        self.assertEqual(response.status_code, 204)
+
+        page = self.client.get(reverse("appointments:doctors_list"), {"doctor_id": self.doctor.pk, "date": self.day})
+        self.assertContains(page, 'id="live-slots"')
+        self.assertNotContains(page, "data-events")
+
+
+@override_settings(LIVE_EVENTS_BROKER="appointments.tests.RecordingBroker")
+class LiveStreamTests(SlotFixtureMixin, TransactionTestCase):
+    """Snapshots are read on pooled threads, which only see committed rows."""
+
+    def setUp(self):
+        super().setUp()
+        live.get_broker.cache_clear()
+        self.addCleanup(live.get_broker.cache_clear)
+        self.url = reverse("appointments:api_slot_events", args=[self.doctor.pk])
+
+    async def test_stream_sends_snapshot_then_events(self):
+        await self.async_client.aforce_login(self.patient)
+        response = await self.async_client.get(self.url, {"date": self.day})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b"retry:"))
+        snapshot = (await anext(chunks)).decode()
+        self.assertTrue(snapshot.startswith("event: snapshot\n"))
+        self.assertEqual(len(json.loads(snapshot.split("data: ", 1)[1])), 2)
+
+        live.get_broker().publish(live.channel_for(self.doctor.pk, self.day), {"type": "booked", "id": 7})
+        self.assertEqual(await anext(chunks), b'event: booked\ndata: {"id": 7}\n\n')
+
+        # A client disconnect cancels the task reading the stream.
+        reader = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(live.connection_count(), 0)
+
+    @override_settings(LIVE_EVENTS_BUFFER_SIZE=1)
+    async def test_lagging_reader_gets_a_fresh_snapshot(self):
+        await self.async_client.aforce_login(self.patient)
+        response = await self.async_client.get(self.url, {"date": self.day})
+        chunks = aiter(response.streaming_content)
+        await anext(chunks)
+        await anext(chunks)
+
+        channel = live.channel_for(self.doctor.pk, self.day)
+        for i in range(3):
+            live.get_broker().publish(channel, {"type": "booked", "id": i})
+        resync = (await anext(chunks)).decode()
+        self.assertTrue(resync.startswith("event: snapshot\n"))
+        self.assertEqual(len(json.loads(resync.split("data: ", 1)[1])), 2)
+        await chunks.aclose()
+
+    async def test_doctors_page_opens_the_stream_under_asgi(self):
+        await self.async_client.aforce_login(self.patient)
+        page = await self.async_client.get(
+            reverse("appointments:doctors_list"), {"doctor_id": self.doctor.pk, "date": self.day},
+        )
+        self.assertContains(page, f'data-events="{self.url}?date={self.day}"')
+
+    def test_idle_stream_holds_no_request_thread(self):
+        self.client.force_login(self.patient)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": self.url, "raw_path": self.url.encode(), "root_path": "",
+            "query_string": f"date={self.day}".encode(),
+            "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+            "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+        }
+
+        def request_threads():
+            # Snapshots run on the loop's default executor ("asyncio_N").
+            return sum(not t.name.startswith("asyncio_") for t in threading.enumerate())
+
+        async def request():
+            requested, disconnected, opened = False, asyncio.Event(), asyncio.Event()
+
+            async def receive():
+                nonlocal requested
+                if not requested:
+                    requested = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message.get("body", b"").startswith(b"event: snapshot"):
+                    opened.set()
+
+            before = request_threads()
+            handler = asyncio.ensure_future(ASGIHandler()(scope, receive, send))
+            await opened.wait()
+            for _ in range(50):
+                if request_threads() <= before:
+                    break
+                await asyncio.sleep(0.1)
+            held = request_threads() - before
+            disconnected.set()
+            await handler
+            return held
+
+        self.assertEqual(asyncio.run(request()), 0)
+
+
+class CalendarFeedTests(SlotFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking = claim_slot(AvailabilitySlot.objects.order_by("start").first().pk, self.patient)
+        self.url = reverse("appointments:calendar_feed", args=[self.patient.pk, ics.feed_token(self.patient)])
+
+    def feed(self, url=None, **headers):
+        return self.client.get(url or self.url, headers=headers)
+
+    def body(self, url=None):
+        response = self.feed(url)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return content.decode()
+
+    def test_feed_requires_a_valid_token(self):
+        bad = reverse("appointments:calendar_feed", args=[self.patient.pk, "0" * 32])
+        self.assertEqual(self.feed(bad).status_code, 404)
+
+        self.patient.set_password("changed")
+        self.patient.save()
+        self.assertEqual(self.feed().status_code, 404)
+
+    def test_cancellation_keeps_the_uid_and_bumps_the_sequence(self):
+        uid = f"UID:booking-{self.booking.pk}@hms.local"
+        body = self.body()
+        self.assertIn(uid, body)
+        self.assertIn("SEQUENCE:0\r\n", body)
+        self.assertIn("SUMMARY:Appointment with Dr. doc\r\n", body)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_booking(self.booking)
+        self.assertEqual(CancelledBooking.objects.count(), 1)
+
+        doctor_url = reverse("appointments:calendar_feed", args=[self.doctor.pk, ics.feed_token(self.doctor)])
+        for url in (self.url, doctor_url):
+            body = self.body(url)
+            self.assertIn(uid, body)
+            self.assertIn("SEQUENCE:1\r\nDTSTART", body)
+            self.assertIn("STATUS:CANCELLED\r\n", body)
+            self.assertNotIn("STATUS:CONFIRMED", body)
+
+    def test_unchanged_feed_is_a_304(self):
+        first = self.feed()
+        self.assertEqual(first["Content-Type"], "text/calendar; charset=utf-8")
+        b"".join(first.streaming_content)
+
+        with self.assertNumQueries(1):
+            response = self.feed(if_none_match=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        with self.assertNumQueries(1):
+            response = self.feed(if_modified_since=first["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_booking(self.booking)
+        response = self.feed(if_none_match=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_long_lines_are_folded(self):
+        line = ics._fold("SUMMARY:" + "é" * 80)
+        pieces = line.removesuffix("\r\n").split("\r\n")
+        self.assertTrue(all(len(p.encode()) <= 75 for p in pieces))
+        self.assertEqual("".join(p.removeprefix(" ") for p in pieces), "SUMMARY:" + "é" * 80)
+
+
+class SyncIndexesTests(TestCase):
+
+    def test_missing_indexes_are_created(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX "slot_free_doctor_start_idx"')
+
+        out = StringIO()
+        call_command("sync_indexes", stdout=out)
+        self.assertIn("Created 1 indexes.", out.getvalue())
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, AvailabilitySlot._meta.db_table)
+        self.assertIn("slot_free_doctor_start_idx", constraints)
+
+        out = StringIO()
+        call_command("sync_indexes", stdout=out)
+        self.assertIn("All indexes are present.", out.getvalue())
@@ -1,12 +1,25 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = "appointments"
 
 urlpatterns = [
     path("doctor-dashboard/", views.doctor_dashboard, name="doctor_dashboard"),
+    path("doctor-dashboard/slots.json", views.doctor_slots_json, name="doctor_slots_json"),
+    path("doctor-dashboard/export.csv", views.export_history, name="export_history"),
     path("doctors/", views.doctors_list, name="doctors_list"),
     path("book/<int:slot_id>/", views.book_slot, name="book_slot"),
     path("my-bookings/", views.my_bookings, name="my_bookings"),
+    path("my-bookings.json", views.my_bookings_json, name="my_bookings_json"),
     path("cancel/<int:booking_id>/", views.cancel_booking, name="cancel_booking"),
+    path("waitlist/", views.join_waitlist, name="join_waitlist"),
+    path("waitlist/<int:entry_id>/leave/", views.leave_waitlist, name="leave_waitlist"),
+    path("calendar/<int:user_id>/<str:token>.ics", views.calendar_feed, name="calendar_feed"),
+
+    path("api/doctors/", api.doctors, name="api_doctors"),
+    path("api/doctors/<int:doctor_id>/slots/", api.doctor_slots, name="api_doctor_slots"),
+    path("api/doctors/<int:doctor_id>/slots/events/", api.slot_events, name="api_slot_events"),
+    path("api/slots/search/", api.search_slots, name="api_search_slots"),
+    path("api/slots/<int:slot_id>/book/", api.book, name="api_book"),
+    path("api/bookings/<int:booking_id>/cancel/", api.cancel, name="api_cancel"),
 ]
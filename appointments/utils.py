@@ -1,166 +1,103 @@
 import datetime
-from django.core.mail import EmailMultiAlternatives
+from functools import lru_cache
+from urllib.parse import quote_plus
+
 from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import get_template
+
+from .outbox import enqueue
 
 
-def to_gcal_format(iso_dt):
-    dt = datetime.datetime.fromisoformat(iso_dt.replace("Z", "+00:00"))
-    return dt.strftime("%Y%m%dT%H%M%SZ")
+def to_gcal_format(dt):
+    return dt.astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
 
 
-def gcal_link_for_patient(doctor_name, start_iso, end_iso):
-    start = to_gcal_format(start_iso)
-    end = to_gcal_format(end_iso)
+def gcal_link_for_patient(doctor_name, start, end):
+    name = quote_plus(doctor_name)
 
     return (
         "https://calendar.google.com/calendar/render"
         f"?action=TEMPLATE"
-        f"&text=Appointment+With+Dr+{doctor_name}"
-        f"&dates={start}/{end}"
-        f"&details=Your+appointment+with+Dr+{doctor_name}"
+        f"&text=Appointment+With+Dr+{name}"
+        f"&dates={to_gcal_format(start)}/{to_gcal_format(end)}"
+        f"&details=Your+appointment+with+Dr+{name}"
     )
 
-def gcal_link_for_doctor(patient_name, start_iso, end_iso):
-    start = to_gcal_format(start_iso)
-    end = to_gcal_format(end_iso)
+def gcal_link_for_doctor(patient_name, start, end):
+    name = quote_plus(patient_name)
 
     return (
         "https://calendar.google.com/calendar/render"
         f"?action=TEMPLATE"
-        f"&text=Appointment+With+Patient+{patient_name}"
-        f"&dates={start}/{end}"
-        f"&details=Appointment+Booked+by+Patient+{patient_name}"
+        f"&text=Appointment+With+Patient+{name}"
+        f"&dates={to_gcal_format(start)}/{to_gcal_format(end)}"
+        f"&details=Appointment+Booked+by+Patient+{name}"
     )
 
 
-def build_patient_email_html(doctor_name, slot):
-    start_iso = slot.start.isoformat()
-    end_iso = slot.end.isoformat()
-
-    gcal_link = gcal_link_for_patient(doctor_name, start_iso, end_iso)
-
-    return f"""
-        <h2>Your Appointment is Confirmed ✔</h2>
-
-        <p><b>Doctor:</b> Dr. {doctor_name}</p>
-        <p><b>Time:</b> {slot.start.strftime('%H:%M %d-%m-%Y')} - {slot.end.strftime('%H:%M %d-%m-%Y')}</p>
-
-        <a href="{gcal_link}"
-           style="background:#1a73e8;color:white;padding:12px 20px;
-           text-decoration:none;border-radius:8px;font-size:16px;">
-           ➕ Add to Google Calendar
-        </a>
-
-        <br><br>
-        <p>Thank you for using HMS!</p>
-    """
+@lru_cache(maxsize=None)
+def _email_templates(name):
+    # Compiled once per process; rendering is then just a context pass.
+    return get_template(f"emails/{name}.txt"), get_template(f"emails/{name}.html")
 
 
-def build_doctor_email_html(patient_user, slot):
-    start_iso = slot.start.isoformat()
-    end_iso = slot.end.isoformat()
+def render_email(name, context):
+    """Render ``templates/emails/<name>.txt`` and ``.html`` as ``(text, html)``."""
+    text_template, html_template = _email_templates(name)
+    return text_template.render(context), html_template.render(context)
 
-    gcal_link = gcal_link_for_doctor(patient_user.username, start_iso, end_iso)
 
-    return f"""
-        <h2>New Appointment Booked ✔</h2>
+def _message(subject, to, name, context):
+    body, html_body = render_email(name, context)
+    return {"subject": subject, "to": to, "body": body, "html_body": html_body}
 
-        <p><b>Patient Name:</b> {patient_user.username}</p>
-        <p><b>Patient Email:</b> {patient_user.email}</p>
 
-        <p><b>Appointment Time:</b>
-        {slot.start.strftime('%H:%M %d-%m-%Y')} - {slot.end.strftime('%H:%M %d-%m-%Y')}</p>
-
-        <a href="{gcal_link}"
-           style="background:#1a73e8;color:white;padding:12px 20px;
-           text-decoration:none;border-radius:8px;font-size:16px;">
-           ➕ Add to Google Calendar
-        </a>
-
-        <br><br>
-        <p>You have a new appointment scheduled.</p>
-    """
-
-
-def send_appointment_emails(doctor_user, patient_user, slot):
-    try:
-        msg = EmailMultiAlternatives(
+def appointment_messages(doctor_user, patient_user, slot):
+    context = {"doctor": doctor_user, "patient": patient_user, "start": slot.start, "end": slot.end}
+    return [
+        _message(
             "Appointment Confirmation",
-            "",
-            settings.EMAIL_HOST_USER,
-            [patient_user.email],
-        )
-        msg.attach_alternative(
-            build_patient_email_html(doctor_user.username, slot),
-            "text/html",
-        )
-        msg.send()
-        print(f"Email sent to patient: {patient_user.email}")
-    except Exception as e:
-        print("EMAIL ERROR (patient):", e)
-
-    try:
-        msg = EmailMultiAlternatives(
+            patient_user.email,
+            "appointment_patient",
+            {**context, "gcal_link": gcal_link_for_patient(doctor_user.username, slot.start, slot.end)},
+        ),
+        _message(
             "New Appointment Booked",
-            "",
-            settings.EMAIL_HOST_USER,
-            [doctor_user.email],
-        )
-        msg.attach_alternative(
-            build_doctor_email_html(patient_user, slot),
-            "text/html",
-        )
-        msg.send()
-        print(f"Email sent to doctor: {doctor_user.email}")
-    except Exception as e:
-        print("EMAIL ERROR (doctor):", e)
+            doctor_user.email,
+            "appointment_doctor",
+            {**context, "gcal_link": gcal_link_for_doctor(patient_user.username, slot.start, slot.end)},
+        ),
+    ]
 
 
-def send_cancellation_emails(doctor_user, patient_user, slot):
+def cancellation_messages(doctor_user, patient_user, slot):
+    context = {"doctor": doctor_user, "patient": patient_user, "start": slot.start}
+    return [
+        _message("Appointment Cancelled", patient_user.email, "cancellation_patient", context),
+        _message("Appointment Cancelled", doctor_user.email, "cancellation_doctor", context),
+    ]
 
-    subject = "Appointment Cancelled"
 
-    start_time = f"{slot.start.strftime('%Y-%m-%d %H:%M')}"
+def queue_appointment_emails(doctor_user, patient_user, slot):
+    return enqueue(appointment_messages(doctor_user, patient_user, slot))
 
 
-    patient_html = f"""
-        <h2>Your Appointment Has Been Cancelled ❌</h2>
+def queue_cancellation_emails(doctor_user, patient_user, slot):
+    return enqueue(cancellation_messages(doctor_user, patient_user, slot))
 
-        <p><b>Doctor:</b> Dr. {doctor_user.username}</p>
-        <p><b>Original Time:</b> {start_time}</p>
 
-        <p>Your appointment has been successfully cancelled.</p>
+def send_notifications(notifications, connection=None):
     """
-
-    try:
-        msg = EmailMultiAlternatives(
-            subject,
-            "",
-            settings.EMAIL_HOST_USER,
-            [patient_user.email],
-        )
-        msg.attach_alternative(patient_html, "text/html")
-        msg.send()
-    except Exception as e:
-        print("CANCEL EMAIL ERROR (patient):", e)
-
-    doctor_html = f"""
-        <h2>Appointment Cancelled ❌</h2>
-
-        <p><b>Patient:</b> {patient_user.username}</p>
-        <p><b>Original Time:</b> {start_time}</p>
-
-        <p>The patient has cancelled the appointment.</p>
+    Render and send ``(subject, to, template_name, context)`` notifications
+    in one batch over a single mail connection. Returns the number sent.
     """
-
-    try:
-        msg = EmailMultiAlternatives(
-            subject,
-            "",
-            settings.EMAIL_HOST_USER,
-            [doctor_user.email],
-        )
-        msg.attach_alternative(doctor_html, "text/html")
-        msg.send()
-    except Exception as e:
-        print("CANCEL EMAIL ERROR (doctor):", e)
+    messages = []
+    for subject, to, name, context in notifications:
+        body, html_body = render_email(name, context)
+        msg = EmailMultiAlternatives(subject, body, settings.DEFAULT_FROM_EMAIL, [to])
+        msg.attach_alternative(html_body, "text/html")
+        messages.append(msg)
+
+    connection = connection or get_connection()
+    return connection.send_messages(messages) or 0
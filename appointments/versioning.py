@@ -0,0 +1,46 @@
+"""
+Versioned cache keys.
+
+A version lives under its own key and is part of every key derived from
+it, so bumping the version invalidates all of those entries at once and
+readers never see a stale one; the old entries simply expire. Shared by
+the free-slot lists, the picker fragments and the calendar feeds.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def get_cache():
+    return caches[getattr(settings, "AVAILABILITY_CACHE_ALIAS", "default")]
+
+
+def read_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a version lost to eviction never collides
+        # with entries written under an earlier one.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+async def aread_version(key):
+    cache = get_cache()
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
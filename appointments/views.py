@@ -1,13 +1,31 @@
+import csv
+from itertools import chain
+
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.utils.timezone import make_aware, is_naive, now
-from django.db import transaction
-from datetime import datetime, timedelta, date
+from django.utils.timezone import localdate
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_POST, require_safe
+from django.db.models import Value
+from datetime import datetime
 from django.contrib import messages
 from django.contrib.auth.models import User
+from users.models import Profile
+
+from . import availability, fragments, ics, live
+from .booking import SlotUnavailable, claim_slot, day_bookings, release_booking
+from .models import ArchivedBooking, AvailabilitySlot, Booking, WaitlistEntry
+from .pagination import InvalidCursor, akeyset_page, keyset_page
+from .schedule import ALL_WEEKDAYS, SLOT_DURATIONS, day_bounds, generate_slots
 
-from .models import AvailabilitySlot, Booking
-from .utils import send_appointment_emails, send_cancellation_emails
+MAX_SCHEDULE_DAYS = 90
+EXPORT_CHUNK_SIZE = 2000
+WEEKDAY_CHOICES = [
+    (0, "Mon"), (1, "Tue"), (2, "Wed"), (3, "Thu"), (4, "Fri"), (5, "Sat"), (6, "Sun"),
+]
 
 
 def generate_time_choices():
@@ -28,65 +46,117 @@ def generate_time_choices():
     return times
 
 
+# Built once per process; the dashboard renders these options four times.
+TIME_CHOICES = generate_time_choices()
+
+
+def _doctor_slots(doctor, selected_date=None):
+    slots = AvailabilitySlot.objects.filter(doctor=doctor).only("id", "start", "end", "booked")
+
+    if selected_date:
+        day_start, day_end = day_bounds(selected_date)
+        slots = slots.filter(start__gte=day_start, start__lt=day_end)
+
+    return slots
+
+
+async def _aresolve_user(request):
+    """
+    Load the user and their role with the async ORM.
+
+    ``request.user`` is replaced with the loaded user so that templates and
+    context processors never trigger the synchronous lazy lookup.
+    """
+    user = await request.auser()
+    request.user = user
+    if User.profile.is_cached(user):
+        role = user.profile.role
+    else:
+        role = await Profile.objects.filter(user_id=user.pk).values_list("role", flat=True).afirst()
+    return user, role
+
+
+def _bookings_for(user, role):
+    if role == "doctor":
+        return (
+            Booking.objects.filter(slot__doctor=user)
+            .select_related("slot", "patient")
+            .only("id", "slot__start", "slot__end", "patient__username")
+        )
+
+    return (
+        Booking.objects.filter(patient=user)
+        .select_related("slot__doctor")
+        .only("id", "slot__start", "slot__end", "slot__doctor__username")
+    )
+
+
 @login_required
 def doctor_dashboard(request):
     if request.user.profile.role != "doctor":
         messages.error(request, "Unauthorized access!")
         return redirect("home")
 
-    time_choices = generate_time_choices()
-
     if request.method == "POST":
         date_str = request.POST.get("date")
+        until_str = request.POST.get("until_date") or date_str
         start_time_str = request.POST.get("start_time")
         end_time_str = request.POST.get("end_time")
+        break_start_str = request.POST.get("break_start")
+        break_end_str = request.POST.get("break_end")
+        weekdays = request.POST.getlist("weekdays") or ALL_WEEKDAYS
 
         if not date_str or not start_time_str or not end_time_str:
             messages.error(request, "All fields are required.")
             return redirect("appointments:doctor_dashboard")
 
         try:
-            start_naive = datetime.strptime(f"{date_str} {start_time_str}", "%Y-%m-%d %H:%M")
-            end_naive = datetime.strptime(f"{date_str} {end_time_str}", "%Y-%m-%d %H:%M")
+            start_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+            until_date = datetime.strptime(until_str, "%Y-%m-%d").date()
+            day_start = datetime.strptime(start_time_str, "%H:%M").time()
+            day_end = datetime.strptime(end_time_str, "%H:%M").time()
+            breaks = []
+            if break_start_str and break_end_str:
+                breaks.append((
+                    datetime.strptime(break_start_str, "%H:%M").time(),
+                    datetime.strptime(break_end_str, "%H:%M").time(),
+                ))
+            weekdays = [int(d) for d in weekdays]
+            duration = int(request.POST.get("duration") or 30)
         except ValueError:
             messages.error(request, "Invalid date or time format.")
             return redirect("appointments:doctor_dashboard")
 
-        start_dt = make_aware(start_naive)
-        end_dt = make_aware(end_naive)
-
-        if start_dt >= end_dt:
+        if day_start >= day_end:
             messages.error(request, "End time must be later than start time.")
             return redirect("appointments:doctor_dashboard")
 
-        duration = 30
-        current = start_dt
-
-        slot_count = 0
+        if until_date < start_date:
+            messages.error(request, "Repeat-until date must not be before the start date.")
+            return redirect("appointments:doctor_dashboard")
 
-        while current + timedelta(minutes=duration) <= end_dt:
-            slot_end = current + timedelta(minutes=duration)
+        if (until_date - start_date).days >= MAX_SCHEDULE_DAYS:
+            messages.error(request, f"Schedules can cover at most {MAX_SCHEDULE_DAYS} days.")
+            return redirect("appointments:doctor_dashboard")
 
-            if current > now():
-                AvailabilitySlot.objects.get_or_create(
-                    doctor=request.user,
-                    start=current,
-                    end=slot_end,
-                )
-                slot_count += 1
+        if duration not in SLOT_DURATIONS:
+            messages.error(request, "Invalid slot length.")
+            return redirect("appointments:doctor_dashboard")
 
-            current = slot_end
+        slot_count = len(generate_slots(
+            request.user,
+            start_date,
+            until_date,
+            day_start,
+            day_end,
+            weekdays=weekdays,
+            slot_minutes=duration,
+            breaks=breaks,
+        ))
 
         messages.success(request, f"{slot_count} slots created successfully!")
         return redirect("appointments:doctor_dashboard")
 
-    today = date.today()
-    available_dates = [today + timedelta(days=i) for i in range(30)]
-
-    all_slots = AvailabilitySlot.objects.filter(
-        doctor=request.user
-    ).order_by("start")
-
     selected_date_str = request.GET.get("filter_date")
     selected_date = None
 
@@ -97,20 +167,29 @@ def doctor_dashboard(request):
             messages.error(request, "Invalid date selected.")
             selected_date = None
 
-    slots = all_slots.filter(start__date=selected_date) if selected_date else all_slots
+    slots = _doctor_slots(request.user, selected_date)
+
+    try:
+        slots, next_cursor = keyset_page(slots, request.GET.get("after"))
+    except InvalidCursor:
+        messages.error(request, "Invalid page.")
+        slots, next_cursor = keyset_page(slots)
 
     return render(request, "appointments/doctor_dashboard.html", {
         "slots": slots,
-        "time_choices": time_choices,
-        "available_dates": available_dates,
+        "next_cursor": next_cursor,
+        "time_choices": TIME_CHOICES,
+        "weekday_choices": WEEKDAY_CHOICES,
+        "slot_durations": SLOT_DURATIONS,
+        "date_select": fragments.dashboard_date_select(request.user.pk, selected_date),
         "selected_date": selected_date_str,
     })
 
 
 @login_required
-def doctors_list(request):
+async def doctors_list(request):
 
-    doctors = User.objects.filter(profile__role="doctor")
+    user, role = await _aresolve_user(request)
 
     selected_doctor_id = request.GET.get("doctor_id")
     selected_date_str = request.GET.get("date")
@@ -118,22 +197,17 @@ def doctors_list(request):
     doctor = None
     slots = []
 
-    today = date.today()
-    available_dates = [today + timedelta(days=i) for i in range(30)]
+    date_select = None
 
     if selected_doctor_id:
-        try:
-            doctor = User.objects.get(pk=selected_doctor_id)
-        except User.DoesNotExist:
+        if selected_doctor_id.isdigit():
+            doctor = await User.objects.filter(
+                pk=selected_doctor_id, profile__role="doctor",
+            ).only("id", "username").afirst()
+        if doctor is None:
             messages.error(request, "Doctor not found.")
             return redirect("appointments:doctors_list")
 
-        doctor_slots = AvailabilitySlot.objects.filter(
-            doctor=doctor,
-            booked=False,
-            start__gt=now(),
-        ).order_by("start")
-
         if selected_date_str:
             try:
                 selected_date_obj = datetime.strptime(selected_date_str, "%Y-%m-%d").date()
@@ -141,15 +215,27 @@ def doctors_list(request):
                 messages.error(request, "Invalid date selected.")
                 selected_date_obj = None
 
+        # Fully booked days stay in the picker so patients can join their waitlist.
+        date_select = await fragments.adate_select(doctor.pk, selected_date_obj)
+
         if selected_date_obj:
-            slots = doctor_slots.filter(start__date=selected_date_obj)
+            slots = await availability.afree_slots(doctor.pk, selected_date_obj)
+
+    can_wait = role == "patient" and bool(selected_date_obj) and not slots and selected_date_obj >= localdate()
+    can_wait = can_wait and not await day_bookings(doctor.pk, selected_date_obj).filter(patient=user).aexists()
+    waitlisted = can_wait and await WaitlistEntry.objects.filter(
+        doctor=doctor, patient=user, date=selected_date_obj,
+    ).aexists()
 
     return render(request, "appointments/doctors_list.html", {
-        "doctors": doctors,
+        "doctor_select": await fragments.adoctor_select(doctor.pk if doctor else None),
         "selected_doctor": doctor,
         "selected_date": selected_date_str,
-        "available_dates": available_dates,
+        "date_select": date_select,
+        "live_events": live.can_stream(request),
         "slots": slots,
+        "can_wait": can_wait,
+        "waitlisted": waitlisted,
     })
 
 
@@ -160,63 +246,243 @@ def book_slot(request, slot_id):
         messages.error(request, "Only patients can book appointments.")
         return redirect("home")
 
-    slot = get_object_or_404(AvailabilitySlot, pk=slot_id)
+    try:
+        claim_slot(slot_id, request.user)
+    except AvailabilitySlot.DoesNotExist:
+        raise Http404("No AvailabilitySlot matches the given query.")
+    except SlotUnavailable:
+        messages.error(request, "This slot has already been booked.")
+        return render(request, "appointments/booking_failed.html", status=409)
+
+    messages.success(request, "Appointment booked successfully!")
+    return redirect("appointments:my_bookings")
+
+
+@login_required
+async def my_bookings(request):
+
+    user, role = await _aresolve_user(request)
+    bookings = _bookings_for(user, role)
 
     try:
-        with transaction.atomic():
-            locked = AvailabilitySlot.objects.select_for_update().get(pk=slot_id)
+        bookings, next_cursor = await akeyset_page(bookings, request.GET.get("after"), start_field="slot__start")
+    except InvalidCursor:
+        messages.error(request, "Invalid page.")
+        bookings, next_cursor = await akeyset_page(bookings, start_field="slot__start")
+
+    waitlist = []
+    if role == "patient":
+        waitlist = [
+            e async for e in
+            WaitlistEntry.objects.filter(patient=user, date__gte=localdate())
+            .select_related("doctor").only("id", "date", "doctor__username").order_by("date", "id")
+        ]
+
+    return render(request, "appointments/my_bookings.html", {
+        "bookings": bookings,
+        "next_cursor": next_cursor,
+        "role": role,
+        "waitlist": waitlist,
+        "feed_url": request.build_absolute_uri(
+            reverse("appointments:calendar_feed", args=[user.pk, ics.feed_token(user)])
+        ),
+    })
 
-            if locked.booked:
-                messages.error(request, "This slot has already been booked.")
-                return render(request, "appointments/booking_failed.html")
 
-            locked.booked = True
-            locked.save()
+@login_required
+def cancel_booking(request, booking_id):
 
-            Booking.objects.create(slot=locked, patient=request.user)
+    booking = get_object_or_404(Booking.objects.select_related("slot__doctor", "patient"), pk=booking_id)
 
-    except Exception as e:
-        messages.error(request, "Something went wrong while booking the slot.")
-        return render(request, "appointments/booking_failed.html")
+    if request.user != booking.patient:
+        messages.error(request, "You cannot cancel this booking.")
+        return redirect("appointments:my_bookings")
 
-    send_appointment_emails(doctor_user=locked.doctor, patient_user=request.user, slot=locked)
+    release_booking(booking)
 
-    messages.success(request, "Appointment booked successfully!")
+    messages.success(request, "Your appointment has been canceled.")
     return redirect("appointments:my_bookings")
 
 
+@require_POST
 @login_required
-def my_bookings(request):
+def join_waitlist(request):
 
-    if request.user.profile.role == "doctor":
-        bookings = Booking.objects.filter(slot__doctor=request.user).order_by("slot__start")
+    if request.user.profile.role != "patient":
+        messages.error(request, "Only patients can join a waitlist.")
+        return redirect("home")
+
+    try:
+        doctor_id = int(request.POST.get("doctor_id", ""))
+        day = datetime.strptime(request.POST.get("date", ""), "%Y-%m-%d").date()
+    except ValueError:
+        messages.error(request, "Invalid date selected.")
+        return redirect("appointments:doctors_list")
+
+    doctor = get_object_or_404(User, pk=doctor_id, profile__role="doctor")
+
+    if day < localdate():
+        messages.error(request, "You can only wait for upcoming days.")
+    elif day_bookings(doctor.pk, day).filter(patient=request.user).exists():
+        messages.error(request, "You already have an appointment with this doctor on that day.")
+    elif availability.free_slots(doctor.pk, day):
+        messages.error(request, "There are still free slots on that day.")
     else:
-        bookings = Booking.objects.filter(patient=request.user).order_by("slot__start")
+        WaitlistEntry.objects.get_or_create(doctor=doctor, patient=request.user, date=day)
+        messages.success(request, "You're on the waitlist. If a slot frees up it will be booked for you.")
 
-    return render(request, "appointments/my_bookings.html", {"bookings": bookings})
+    return redirect(f"{reverse('appointments:doctors_list')}?doctor_id={doctor.pk}&date={day.isoformat()}")
 
 
+@require_POST
 @login_required
-def cancel_booking(request, booking_id):
+def leave_waitlist(request, entry_id):
 
-    booking = get_object_or_404(Booking, pk=booking_id)
+    deleted, _ = WaitlistEntry.objects.filter(pk=entry_id, patient=request.user).delete()
+    if deleted:
+        messages.success(request, "You have left the waitlist.")
+    return redirect("appointments:my_bookings")
+
+
+@login_required
+async def doctor_slots_json(request):
+
+    user, role = await _aresolve_user(request)
+
+    if role != "doctor":
+        return JsonResponse({"error": "Unauthorized access!"}, status=403)
+
+    selected_date = None
+    if request.GET.get("date"):
+        try:
+            selected_date = datetime.strptime(request.GET["date"], "%Y-%m-%d").date()
+        except ValueError:
+            return JsonResponse({"error": "Invalid date selected."}, status=400)
+
+    try:
+        slots, next_cursor = await akeyset_page(_doctor_slots(user, selected_date), request.GET.get("after"))
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor."}, status=400)
+
+    return JsonResponse({
+        "results": [
+            {"id": s.id, "start": s.start, "end": s.end, "booked": s.booked}
+            for s in slots
+        ],
+        "next": next_cursor,
+    })
 
-    if request.user != booking.patient:
-        messages.error(request, "You cannot cancel this booking.")
-        return redirect("appointments:my_bookings")
 
-    slot = booking.slot
+@login_required
+async def my_bookings_json(request):
+
+    user, role = await _aresolve_user(request)
+
+    try:
+        bookings, next_cursor = await akeyset_page(
+            _bookings_for(user, role), request.GET.get("after"), start_field="slot__start"
+        )
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor."}, status=400)
+
+    results = []
+    for b in bookings:
+        row = {"id": b.id, "start": b.slot.start, "end": b.slot.end}
+        if role == "doctor":
+            row["patient"] = b.patient.username
+        else:
+            row["doctor"] = b.slot.doctor.username
+        results.append(row)
+
+    return JsonResponse({"results": results, "next": next_cursor})
 
-    slot.booked = False
-    slot.save()
 
-    send_cancellation_emails(
-        doctor_user=slot.doctor,
-        patient_user=request.user,
-        slot=slot
+class _Echo:
+    def write(self, value):
+        return value
+
+
+@login_required
+def export_history(request):
+
+    if request.user.profile.role != "doctor":
+        messages.error(request, "Unauthorized access!")
+        return redirect("home")
+
+    # Archived bookings all predate the live slots, so streaming them first
+    # keeps the file in start order.
+    archived = (
+        ArchivedBooking.objects.filter(doctor=request.user)
+        .order_by("start", "id")
+        .values_list(
+            "slot_id", "start", "end", Value(True),
+            "booking_id", "patient__username", "patient__email", "booked_at",
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    current = (
+        AvailabilitySlot.objects.filter(doctor=request.user)
+        .order_by("start", "id")
+        .values_list(
+            "id", "start", "end", "booked",
+            "booking__id", "booking__patient__username", "booking__patient__email", "booking__created_at",
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    writer = csv.writer(_Echo())
+    header = [
+        "slot_id", "start", "end", "booked",
+        "booking_id", "patient", "patient_email", "booked_at",
+    ]
+
+    def stream():
+        yield writer.writerow(header)
+        for row in chain(archived, current):
+            yield writer.writerow(["" if v is None else v for v in row])
+
+    response = StreamingHttpResponse(stream(), content_type="text/csv")
+    response["Content-Disposition"] = 'attachment; filename="history.csv"'
+    return response
+
+
+@require_safe
+def calendar_feed(request, user_id, token):
+    """The tokenized ``.ics`` feed of ``user_id``'s appointments, for calendar apps."""
+    user = (
+        User.objects.select_related("profile")
+        .only("id", "username", "password", "profile__role")
+        .filter(pk=user_id)
+        .first()
     )
+    if user is None or not ics.check_token(user, token):
+        raise Http404
+
+    version = ics.get_version(user.pk)
+    etag = ics.etag_for(user.pk, version)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    cached = ics.cached_feed(user.pk, version)
+    if cached is not None:
+        last_modified, body = cached
+    else:
+        last_modified, body = ics.stream_feed(user, user.profile.role, version)
 
-    booking.delete()
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if not_modified is not None:
+        return not_modified
 
-    messages.success(request, "Your appointment has been canceled.")
-    return redirect("appointments:my_bookings")
+    content_type = "text/calendar; charset=utf-8"
+    if cached is not None:
+        response = HttpResponse(body, content_type=content_type)
+    else:
+        response = StreamingHttpResponse(body, content_type=content_type)
+    response["ETag"] = etag
+    if timestamp is not None:
+        response["Last-Modified"] = http_date(timestamp)
+    # The URL is a credential; keep it out of shared caches.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,68 @@
+"""
+Streaming record readers and writers for the bulk import/export commands.
+
+Records are read one at a time from CSV (with a header row) or JSON Lines
+and handed out in fixed-size chunks, and exports are written row by row
+from database iterators, so files of any size use constant memory.
+"""
+import csv
+import json
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime, time
+from itertools import islice
+
+FORMATS = ("csv", "jsonl")
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return "jsonl" if str(path).endswith((".jsonl", ".ndjson")) else "csv"
+
+
+@contextmanager
+def open_path(path, mode="r"):
+    """Open ``path`` for text I/O, with ``-`` meaning stdin/stdout."""
+    if path == "-":
+        yield sys.stdin if "r" in mode else sys.stdout
+        return
+    with open(path, mode, newline="", encoding="utf-8") as stream:
+        yield stream
+
+
+def read_records(stream, fmt):
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def write_records(stream, fmt, fields, rows):
+    """Write ``rows`` (tuples ordered like ``fields``) and return the count."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(fields)
+        for row in rows:
+            writer.writerow(["" if v is None else _plain(v) for v in row])
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(dict(zip(fields, map(_plain, row)))) + "\n")
+            count += 1
+    return count
@@ -0,0 +1,241 @@
+"""
+Request-level performance instrumentation.
+
+``MetricsMiddleware`` measures wall time, database queries, template
+rendering, cache hits/misses and SMTP time for every request, aggregates
+them per view for ``metrics_view`` (Prometheus text format) and writes one
+structured log line per request to the ``hms.requests`` logger. Requests
+can optionally be sampled under cProfile, keeping dumps of the slow ones.
+cProfile hooks a whole thread and async requests share the event loop's,
+so one request per process is profiled at a time; a sampled request that
+finds the profiler busy goes unprofiled.
+
+Other modules report into the current request with ``incr()`` and
+``timer()``; outside a request the values only feed the process totals.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger("hms.requests")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNTERS = ("db_queries", "db_seconds", "template_seconds", "cache_hits", "cache_misses", "smtp_seconds")
+
+_current = ContextVar("hms_request_metrics", default=None)
+_lock = threading.Lock()
+_profiling = threading.Lock()
+_views = {}
+_totals = dict.fromkeys(COUNTERS, 0)
+_installed = False
+
+
+def _stop(profiler):
+    if profiler:
+        profiler.disable()
+        _profiling.release()
+
+
+def incr(name, value=1):
+    stats = _current.get()
+    if stats is not None:
+        stats[name] = stats.get(name, 0) + value
+    with _lock:
+        _totals[name] = _totals.get(name, 0) + value
+
+
+@contextmanager
+def timer(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        incr(name, time.perf_counter() - t0)
+
+
+def _record_query(execute, sql, params, many, context):
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        incr("db_queries")
+        incr("db_seconds", time.perf_counter() - t0)
+
+
+def _instrument_connection(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install():
+    """Hook database connections and template rendering (once per process)."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    connection_created.connect(_instrument_connection)
+
+    from django.db import connections
+    for conn in connections.all(initialized_only=True):
+        _instrument_connection(None, conn)
+
+    from django.template.backends.django import Template
+
+    original_render = Template.render
+
+    def render(self, context=None, request=None):
+        with timer("template_seconds"):
+            return original_render(self, context, request)
+
+    Template.render = render
+
+
+def _observe(view, status, duration, stats):
+    with _lock:
+        entry = _views.setdefault(view, {
+            "requests": {},
+            "duration_sum": 0.0,
+            "buckets": [0] * len(DURATION_BUCKETS),
+            **dict.fromkeys(COUNTERS, 0),
+        })
+        entry["requests"][status] = entry["requests"].get(status, 0) + 1
+        entry["duration_sum"] += duration
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                entry["buckets"][i] += 1
+        for name in COUNTERS:
+            entry[name] += stats.get(name, 0)
+
+
+def reset():
+    with _lock:
+        _views.clear()
+        for name in _totals:
+            _totals[name] = 0
+
+
+def render_prometheus():
+    """Render every metric family as one block: its TYPE line, then its samples."""
+    with _lock:
+        views = sorted(_views.items())
+        lines = ["# TYPE hms_requests_total counter"]
+        for view, entry in views:
+            for status, count in sorted(entry["requests"].items()):
+                lines.append(f'hms_requests_total{{view="{view}",status="{status}"}} {count}')
+
+        lines.append("# TYPE hms_request_duration_seconds histogram")
+        for view, entry in views:
+            label = f'view="{view}"'
+            total = sum(entry["requests"].values())
+            for bound, count in zip(DURATION_BUCKETS, entry["buckets"]):
+                lines.append(f'hms_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'hms_request_duration_seconds_bucket{{{label},le="+Inf"}} {total}')
+            lines.append(f"hms_request_duration_seconds_sum{{{label}}} {entry['duration_sum']:.6f}")
+            lines.append(f"hms_request_duration_seconds_count{{{label}}} {total}")
+
+        for name in COUNTERS:
+            lines.append(f"# TYPE hms_{name}_total counter")
+            for view, entry in views:
+                lines.append(f'hms_{name}_total{{view="{view}"}} {entry[name]:g}')
+            lines.append(f'hms_{name}_total{{view="__process__"}} {_totals[name]:g}')
+
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """
+    Serve the metrics to a scraper presenting ``METRICS_TOKEN`` as a bearer
+    token. Without a configured token only logged-in staff can read them.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        allowed = constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4")
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+
+        stats, token, profiler, t0 = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _stop(profiler)
+            _current.reset(token)
+        self._finish(request, response, stats, profiler, t0)
+        return response
+
+    async def _acall(self, request):
+        stats, token, profiler, t0 = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _stop(profiler)
+            _current.reset(token)
+        self._finish(request, response, stats, profiler, t0)
+        return response
+
+    def _start(self):
+        stats = {}
+        token = _current.set(stats)
+        profiler = None
+        sampled = random.random() < getattr(settings, "METRICS_PROFILE_SAMPLE_RATE", 0.0)
+        if sampled and _profiling.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return stats, token, profiler, time.perf_counter()
+
+    def _finish(self, request, response, stats, profiler, t0):
+        duration = time.perf_counter() - t0
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unresolved"
+
+        _observe(view, response.status_code, duration, stats)
+
+        logger.info(json.dumps({
+            "view": view,
+            "method": request.method,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 3),
+            "db_queries": stats.get("db_queries", 0),
+            "db_ms": round(stats.get("db_seconds", 0) * 1000, 3),
+            "template_ms": round(stats.get("template_seconds", 0) * 1000, 3),
+            "cache_hits": stats.get("cache_hits", 0),
+            "cache_misses": stats.get("cache_misses", 0),
+            "smtp_ms": round(stats.get("smtp_seconds", 0) * 1000, 3),
+        }))
+
+        slow_ms = getattr(settings, "METRICS_SLOW_REQUEST_MS", 500)
+        if profiler and duration * 1000 >= slow_ms:
+            directory = getattr(settings, "METRICS_PROFILE_DIR", settings.BASE_DIR / "profiles")
+            os.makedirs(directory, exist_ok=True)
+            name = f"{view.replace(':', '_')}-{int(time.time() * 1000)}.prof"
+            profiler.dump_stats(os.path.join(directory, name))
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'hms.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,6 +72,21 @@ TEMPLATES = [
     },
 ]
 
+# HMS_TEMPLATE_PROFILE=production lists the cached loader explicitly and
+# turns off template debug info, so compiled templates are kept for the
+# life of the process whatever DEBUG is set to.
+if os.environ.get('HMS_TEMPLATE_PROFILE') == 'production':
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS'].update({
+        'debug': False,
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    })
+
 WSGI_APPLICATION = 'hms.wsgi.application'
 
 
@@ -81,6 +100,118 @@ DATABASES = {
     }
 }
 
+# SQLite production profile, enabled with HMS_SQLITE_PROFILE=production.
+# WAL lets readers run alongside the single writer, BEGIN IMMEDIATE takes the
+# write lock up front so busy_timeout can queue writers instead of failing
+# with "database is locked", and connections are kept open between requests.
+# The pragmas are applied to each new connection by hms.sqlite.
+
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
+
+SQLITE_PRAGMAS = {}
+
+if os.environ.get('HMS_SQLITE_PROFILE') == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Any backend works here, e.g. FileBasedCache or RedisCache in production.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+AVAILABILITY_CACHE_ALIAS = 'default'
+
+
+# Session and flash-message storage profile, chosen with HMS_SESSION_PROFILE.
+# "default" is Django's: sessions in the database and messages in a cookie,
+# falling back to the session when they do not fit. "cached_db" reads
+# sessions from SESSION_CACHE_ALIAS and only touches the database when a
+# session changes; the cache must be shared between workers (not LocMemCache)
+# for that to hold. "signed_cookies" keeps sessions client-side, so requests
+# never read or write session rows, but a session cannot be revoked before
+# it expires short of rotating SECRET_KEY. Both keep messages in cookies only.
+
+SESSION_PROFILES = {
+    'default': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.fallback.FallbackStorage',
+    },
+    'cached_db': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.cookie.CookieStorage',
+    },
+    'signed_cookies': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.signed_cookies',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.cookie.CookieStorage',
+    },
+}
+
+_session_profile = os.environ.get('HMS_SESSION_PROFILE', 'default')
+if _session_profile not in SESSION_PROFILES:
+    raise ImproperlyConfigured(
+        f"HMS_SESSION_PROFILE must be one of {', '.join(SESSION_PROFILES)}, not {_session_profile!r}."
+    )
+SESSION_ENGINE = SESSION_PROFILES[_session_profile]['SESSION_ENGINE']
+MESSAGE_STORAGE = SESSION_PROFILES[_session_profile]['MESSAGE_STORAGE']
+SESSION_CACHE_ALIAS = 'default'
+
+
+# Authentication
+# ProfileBackend joins users.Profile into the per-request user lookup.
+# ModelBackend stays listed so sessions created before it keep working.
+
+AUTHENTICATION_BACKENDS = [
+    'users.backends.ProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+
+# Password hashing profile, chosen with HMS_PASSWORD_HASHER_PROFILE.
+# "default" is Django's stock list. "tuned" hashes new passwords with PBKDF2
+# at PASSWORD_PBKDF2_ITERATIONS, for hosts where the stock cost makes signup
+# or bulk registration CPU-bound; it keeps Django's iteration count unless
+# HMS_PBKDF2_ITERATIONS asks for another one. "testing" uses MD5 and is
+# only meant for test runs and benchmarks. Every profile still verifies the
+# others' hashes.
+
+DEFAULT_PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASHER_PROFILES = {
+    'default': DEFAULT_PASSWORD_HASHERS,
+    'tuned': ['users.hashers.TunedPBKDF2PasswordHasher'] + DEFAULT_PASSWORD_HASHERS,
+    'testing': ['django.contrib.auth.hashers.MD5PasswordHasher'] + DEFAULT_PASSWORD_HASHERS,
+}
+
+PASSWORD_HASHERS = PASSWORD_HASHER_PROFILES[os.environ.get('HMS_PASSWORD_HASHER_PROFILE', 'default')]
+
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ['HMS_PBKDF2_ITERATIONS']) if os.environ.get('HMS_PBKDF2_ITERATIONS') else None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -116,7 +247,6 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
-import os
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'templates')]
 
@@ -137,4 +267,58 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
 LOGIN_URL = '/users/login/'
 LOGIN_REDIRECT_URL = '/'
-LOGOUT_REDIRECT_URL = '/'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = '/'
+
+
+# Request instrumentation (hms.metrics). Prometheus scrapes /metrics/ with
+# METRICS_TOKEN as a bearer token; while it is unset only staff can read
+# it. A sampled fraction of requests runs under cProfile and those slower
+# than METRICS_SLOW_REQUEST_MS are dumped to METRICS_PROFILE_DIR.
+METRICS_TOKEN = os.environ.get('HMS_METRICS_TOKEN', '')
+METRICS_SLOW_REQUEST_MS = 500
+METRICS_PROFILE_SAMPLE_RATE = 0.0
+METRICS_PROFILE_DIR = BASE_DIR / 'profiles'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'hms.requests': {
+            'handlers': ['console'],
+            'level': os.environ.get('HMS_REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+
+# Outgoing email is queued in appointments.EmailOutbox and delivered by
+# `python manage.py send_outbox`.
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_BACKOFF_SECONDS = 30
+EMAIL_OUTBOX_BACKOFF_MAX_SECONDS = 3600
+
+
+# Past slots older than this many days are pruned (free) or archived
+# (booked) by `python manage.py prune_slots`.
+SLOT_RETENTION_DAYS = 90
+
+
+# Live slot events for the doctors page (appointments.live). The broker
+# can be swapped for one backed by an external service when running more
+# than one ASGI worker.
+LIVE_EVENTS_BROKER = 'appointments.live.LocalBroker'
+LIVE_EVENTS_BUFFER_SIZE = 64
+LIVE_EVENTS_HEARTBEAT_SECONDS = 20
+LIVE_EVENTS_MAX_STREAM_SECONDS = 600
+LIVE_EVENTS_MAX_CONNECTIONS = 10000
+
+
+# iCalendar feeds (appointments.ics) list bookings from this many days back
+# onwards. Event UIDs are "booking-<id>@ICS_UID_DOMAIN" and must never change.
+ICS_FEED_PAST_DAYS = 30
+ICS_UID_DOMAIN = 'hms.local'
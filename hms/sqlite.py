@@ -0,0 +1,24 @@
+"""
+Per-connection SQLite tuning.
+
+``settings.SQLITE_PRAGMAS`` is applied to every new SQLite connection, so
+the production profile (WAL, relaxed fsync, busy timeout, larger page cache
+and mmap) takes effect no matter which thread or worker opens it.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if not pragmas:
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
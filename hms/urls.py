@@ -18,9 +18,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
 
+from hms.metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", TemplateView.as_view(template_name="home.html"), name="home"),
     path("users/", include("users.urls")),
     path("appointments/", include("appointments.urls")),
+    path("metrics/", metrics_view, name="metrics"),
 ]
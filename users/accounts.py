@@ -0,0 +1,117 @@
+"""
+Account creation.
+
+``create_account`` inserts the user and fills in its profile in one
+transaction, so no account is ever visible without its role. Duplicate
+usernames and emails are checked inside that transaction; with BEGIN
+IMMEDIATE the checks cannot race the insert.
+
+``bulk_create_accounts`` is the import path: it writes whole chunks of
+users and profiles with two ``bulk_create`` calls.
+"""
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ROLE_CHOICES, Profile
+
+ROLES = {value for value, _ in ROLE_CHOICES}
+
+
+class AccountExists(Exception):
+    pass
+
+
+class UsernameTaken(AccountExists):
+    pass
+
+
+class EmailTaken(AccountExists):
+    pass
+
+
+def create_account(username, email, password, role, **profile_fields):
+    if role not in ROLES:
+        raise ValueError(f"Unknown role: {role!r}")
+
+    user = User(username=User.normalize_username(username), email=User.objects.normalize_email(email))
+    # Hashed before the transaction opens so the write lock is not held for it.
+    user.set_password(password)
+
+    with transaction.atomic():
+        if User.objects.filter(username=user.username).exists():
+            raise UsernameTaken(user.username)
+        if User.objects.filter(email=user.email).exists():
+            raise EmailTaken(user.email)
+        user.save()
+        # The post_save receiver has inserted a blank profile.
+        Profile.objects.filter(user=user).update(role=role, **profile_fields)
+
+    return user
+
+
+def _encoded_password(value):
+    if value:
+        try:
+            identify_hasher(value)
+            return value
+        except ValueError:
+            pass
+    return make_password(None)
+
+
+def bulk_create_accounts(records, default_role="patient"):
+    """
+    Create accounts for a chunk of import records in one transaction.
+
+    ``bulk_create`` sends no ``post_save``, so the profiles are inserted
+    here together with their users and no user is ever left without one.
+    Records with an unknown role, or whose username or email is already
+    taken (in the database or earlier in the chunk), are skipped.
+    ``password`` must be an encoded hash, such as one written by
+    ``export_data``; anything else leaves the password unusable.
+
+    Returns ``(created, skipped)``.
+    """
+    candidates = []
+    usernames, emails = set(), set()
+    skipped = 0
+    for record in records:
+        username = User.normalize_username((record.get("username") or "").strip())
+        email = User.objects.normalize_email((record.get("email") or "").strip())
+        role = record.get("role") or default_role
+        if not username or role not in ROLES or username in usernames or (email and email in emails):
+            skipped += 1
+            continue
+        usernames.add(username)
+        if email:
+            emails.add(email)
+        candidates.append((username, email, role, record))
+
+    with transaction.atomic():
+        taken_usernames, taken_emails = set(), set()
+        for username, email in User.objects.filter(
+            Q(username__in=usernames) | Q(email__in=emails)
+        ).values_list("username", "email"):
+            taken_usernames.add(username)
+            taken_emails.add(email)
+
+        users, profiles = [], []
+        for username, email, role, record in candidates:
+            if username in taken_usernames or (email and email in taken_emails):
+                skipped += 1
+                continue
+            users.append(User(username=username, email=email, password=_encoded_password(record.get("password"))))
+            profiles.append(Profile(
+                role=role,
+                specialization=record.get("specialization") or None,
+                phone=record.get("phone") or None,
+            ))
+
+        User.objects.bulk_create(users)
+        for user, profile in zip(users, profiles):
+            profile.user = user
+        Profile.objects.bulk_create(profiles)
+
+    return len(users), skipped
@@ -0,0 +1,23 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+
+
+class ProfileBackend(ModelBackend):
+    """
+    ModelBackend that loads the session user together with their Profile in
+    one joined query, so ``request.user.profile.role`` costs nothing extra.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = User._default_manager.select_related("profile").get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        try:
+            user = await User._default_manager.select_related("profile").aget(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
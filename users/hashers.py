@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the work factor taken from ``PASSWORD_PBKDF2_ITERATIONS``,
+    falling back to Django's own count when that is not set.
+
+    The algorithm name is unchanged, so existing hashes keep verifying and
+    are re-encoded at the configured cost on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, "PASSWORD_PBKDF2_ITERATIONS", None) or PBKDF2PasswordHasher.iterations
@@ -0,0 +1,118 @@
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import localtime
+
+from appointments.benchmarks import seed
+from appointments.models import AvailabilitySlot
+
+WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def _is_write(sql):
+    return sql.lstrip().upper().startswith(WRITE_PREFIXES)
+
+
+class Command(BaseCommand):
+    help = (
+        "Walk patients through login, browse, book and my bookings under each "
+        "session/message storage profile and report the database queries and "
+        "writes per request, split out for the session table. The seeded data "
+        "is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=50)
+        parser.add_argument("--doctors", type=int, default=5)
+        parser.add_argument(
+            "--profiles", nargs="+", default=list(settings.SESSION_PROFILES), choices=list(settings.SESSION_PROFILES),
+        )
+
+    def handle(self, *args, **options):
+        # Keep the per-request log lines out of the report.
+        logging.getLogger("hms.requests").setLevel(logging.WARNING)
+        hashers = settings.PASSWORD_HASHER_PROFILES["testing"]
+
+        with transaction.atomic(), override_settings(PASSWORD_HASHERS=hashers, ALLOWED_HOSTS=["testserver"]):
+            doctors, patients = seed(options["doctors"], options["patients"] * 2, patients=options["patients"],
+                                     prefix="benchsessions")
+            User.objects.filter(pk__in=[p.pk for p in patients]).update(password=make_password("pw"))
+
+            baseline = None
+            for name in options["profiles"]:
+                with override_settings(**settings.SESSION_PROFILES[name]):
+                    totals, elapsed = self.run(doctors, patients)
+                writes = self.report(name, totals, elapsed, len(patients))
+                if baseline is None:
+                    baseline = writes
+                elif baseline:
+                    saved = baseline - writes
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{saved:.2f} fewer writes per request than {options['profiles'][0]} "
+                        f"({saved / baseline:.0%})"
+                    ))
+            transaction.set_rollback(True)
+
+    def flow(self, patient, doctor, slot):
+        day = localtime(slot.start).date().isoformat()
+        return [
+            ("login page", "get", reverse("users:login"), {}),
+            ("log in", "post", reverse("users:login"), {"username": patient.username, "password": "pw"}),
+            ("home", "get", reverse("home"), {}),
+            ("doctors", "get", reverse("appointments:doctors_list"), {}),
+            ("doctor's day", "get", reverse("appointments:doctors_list"), {"doctor_id": doctor.pk, "date": day}),
+            ("book", "get", reverse("appointments:book_slot", args=[slot.pk]), {}),
+            ("my bookings", "get", reverse("appointments:my_bookings"), {}),
+        ]
+
+    def run(self, doctors, patients):
+        totals = {}
+        elapsed = 0.0
+        free = AvailabilitySlot.objects.filter(doctor__in=doctors, booked=False).order_by("start")
+
+        for i, patient in enumerate(patients):
+            doctor = doctors[i % len(doctors)]
+            slot = free.filter(doctor=doctor).first()
+            client = Client()
+
+            for step, method, url, data in self.flow(patient, doctor, slot):
+                t0 = time.perf_counter()
+                with CaptureQueriesContext(connection) as ctx:
+                    getattr(client, method)(url, data)
+                elapsed += time.perf_counter() - t0
+
+                counts = totals.setdefault(step, [0, 0, 0, 0])
+                for query in ctx.captured_queries:
+                    sql = query["sql"]
+                    session = "django_session" in sql
+                    write = _is_write(sql)
+                    counts[0] += 1
+                    counts[1] += write
+                    counts[2] += session
+                    counts[3] += session and write
+
+        return totals, elapsed
+
+    def report(self, name, totals, elapsed, runs):
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(f"{'request':<14} {'queries':>8} {'writes':>8} {'session':>8} {'session writes':>15}")
+        for step, counts in totals.items():
+            self.stdout.write(f"{step:<14} " + " ".join(
+                f"{c / runs:>{w}.2f}" for c, w in zip(counts, (8, 8, 8, 15))
+            ))
+
+        requests = runs * len(totals)
+        all_counts = [sum(c[i] for c in totals.values()) / requests for i in range(4)]
+        self.stdout.write(
+            f"per request: {all_counts[0]:.2f} queries, {all_counts[1]:.2f} writes "
+            f"({all_counts[3]:.2f} to sessions), {elapsed / requests * 1000:.2f}ms"
+        )
+        return all_counts[1]
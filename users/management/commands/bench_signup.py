@@ -0,0 +1,71 @@
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from appointments.benchmarks import summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Register a roster of patients through the signup view under each "
+        "password hasher profile and report signups per second, p50/p99 "
+        "latency and queries per signup. Created users are removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--signups", type=int, default=200)
+        parser.add_argument(
+            "--profiles", default="default,tuned,testing",
+            help="Comma-separated PASSWORD_HASHER_PROFILES keys.",
+        )
+        parser.add_argument("--prefix", default="benchsignup")
+
+    def handle(self, *args, **options):
+        logging.getLogger("hms.requests").setLevel(logging.WARNING)
+        prefix = options["prefix"]
+        url = reverse("users:signup")
+
+        try:
+            for name in options["profiles"].split(","):
+                hashers = settings.PASSWORD_HASHER_PROFILES[name]
+                with override_settings(PASSWORD_HASHERS=hashers, ALLOWED_HOSTS=["testserver"]):
+                    self.run(name, url, f"{prefix}_{name}", options["signups"])
+        finally:
+            User.objects.filter(username__startswith=f"{prefix}_").delete()
+
+    def run(self, name, url, prefix, count):
+        samples = []
+        failures = 0
+        queries = None
+
+        t0 = time.perf_counter()
+        for i in range(count):
+            client = Client()
+            data = {
+                "username": f"{prefix}_{i}",
+                "email": f"{prefix}_{i}@example.com",
+                "role": "patient",
+                "password1": "roster-pass-123",
+                "password2": "roster-pass-123",
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = client.post(url, data)
+                samples.append(time.perf_counter() - start)
+            if response.status_code != 302 or response.url != reverse("home"):
+                failures += 1
+            if queries is None:
+                queries = len(ctx.captured_queries)
+        elapsed = time.perf_counter() - t0
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{name} hashers"))
+        self.stdout.write(f"{count} signups in {elapsed:.2f}s ({count / elapsed:.1f}/s), {failures} failed")
+        self.stdout.write(summarize(samples))
+        self.stdout.write(f"queries per signup: {queries}")
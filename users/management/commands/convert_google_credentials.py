@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from users.models import GoogleCredentials, Profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Move Google credentials from the legacy users_profile.google_credentials "
+        "JSON text column into the GoogleCredentials table, in batches. Rows are "
+        "decoded once, and the legacy column is cleared as each batch is copied."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        table = Profile._meta.db_table
+        with connection.cursor() as cursor:
+            columns = [c.name for c in connection.introspection.get_table_description(cursor, table)]
+        if "google_credentials" not in columns:
+            self.stdout.write("No legacy google_credentials column; nothing to convert.")
+            return
+
+        qn = connection.ops.quote_name
+        select = (
+            f"SELECT id, google_credentials FROM {qn(table)} "
+            f"WHERE id > %s AND google_credentials IS NOT NULL AND google_credentials != '' "
+            f"ORDER BY id LIMIT %s"
+        )
+        moved = skipped = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(select, [last_id, options["batch_size"]])
+                    rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                records = []
+                for profile_id, raw in rows:
+                    try:
+                        records.append(GoogleCredentials(profile_id=profile_id, data=json.loads(raw)))
+                    except ValueError:
+                        skipped += 1
+                        self.stderr.write(f"Skipping profile {profile_id}: invalid JSON.")
+                GoogleCredentials.objects.bulk_create(records, ignore_conflicts=True)
+
+                ids = [r.profile_id for r in records]
+                if ids:
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            f"UPDATE {qn(table)} SET google_credentials = NULL "
+                            f"WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                            ids,
+                        )
+                moved += len(records)
+
+        self.stdout.write(self.style.SUCCESS(f"Converted {moved} profiles ({skipped} skipped)."))
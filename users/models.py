@@ -1,6 +1,5 @@
 from django.db import models
 from django.contrib.auth.models import User
-import json
 
 ROLE_CHOICES = (("doctor", "Doctor"), ("patient", "Patient"))
 
@@ -9,15 +8,30 @@ class Profile(models.Model):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default="patient")
     specialization = models.CharField(max_length=255, blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
-    google_credentials = models.TextField(blank=True, null=True)  # JSON string
 
     def set_google_credentials(self, creds: dict):
-        self.google_credentials = json.dumps(creds)
+        GoogleCredentials.objects.update_or_create(profile=self, defaults={"data": creds})
+        self._google_credentials = creds
 
     def get_google_credentials(self):
-        if not self.google_credentials:
-            return None
-        return json.loads(self.google_credentials)
+        # Kept off the profile row so role checks never load or decode it;
+        # fetched on first use and memoized on the instance.
+        if not hasattr(self, "_google_credentials"):
+            record = GoogleCredentials.objects.filter(profile=self).only("data").first()
+            self._google_credentials = record.data if record else None
+        return self._google_credentials
 
     def __str__(self):
         return f"{self.user.username} Profile ({self.role})"
+
+
+class GoogleCredentials(models.Model):
+    profile = models.OneToOneField(Profile, on_delete=models.CASCADE, primary_key=True, related_name="credentials")
+    data = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "google credentials"
+
+    def __str__(self):
+        return f"Google credentials for profile {self.profile_id}"
@@ -1,3 +1,249 @@
-from django.test import TestCase
+import logging
+import os
+import runpy
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .accounts import EmailTaken, UsernameTaken, bulk_create_accounts, create_account
+from .hashers import TunedPBKDF2PasswordHasher
+from .models import GoogleCredentials
+
+
+def setUpModule():
+    logging.getLogger("hms.requests").setLevel(logging.WARNING)
+
+
+class RoleResolutionTests(TestCase):
+
+    def setUp(self):
+        self.doctor = User.objects.create_user(username="doc", email="doc@example.com", password="pw")
+        self.doctor.profile.role = "doctor"
+        self.doctor.profile.save()
+        self.patient = User.objects.create_user(username="pat", email="pat@example.com", password="pw")
+
+    def profile_lookups(self, user, url):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        return [q["sql"] for q in ctx.captured_queries if q["sql"].lstrip().startswith('SELECT') and
+                'FROM "users_profile"' in q["sql"]]
+
+    def test_role_checks_cost_no_extra_queries(self):
+        cases = [
+            (self.doctor, reverse("appointments:doctor_dashboard")),
+            (self.doctor, reverse("appointments:my_bookings")),
+            (self.patient, reverse("appointments:my_bookings")),
+            (self.patient, reverse("appointments:book_slot", args=[1])),
+        ]
+        for user, url in cases:
+            with self.subTest(url=url, user=user.username):
+                self.assertEqual(self.profile_lookups(user, url), [])
+
+    def test_session_user_is_loaded_with_profile(self):
+        self.client.force_login(self.doctor)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("appointments:doctor_dashboard"))
+
+        user_queries = [q["sql"] for q in ctx.captured_queries if 'FROM "auth_user"' in q["sql"]]
+        self.assertEqual(len(user_queries), 1)
+        self.assertIn('JOIN "users_profile"', user_queries[0])
+
+
+class GoogleCredentialsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="doc", email="doc@example.com", password="pw")
+
+    def test_profile_queries_never_touch_credentials(self):
+        self.user.profile.set_google_credentials({"token": "abc"})
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("appointments:my_bookings"))
+        self.assertFalse([q for q in ctx.captured_queries if "users_googlecredentials" in q["sql"]])
+
+    def test_credentials_are_decoded_once_per_instance(self):
+        self.user.profile.set_google_credentials({"token": "abc", "scopes": ["calendar"]})
+
+        profile = User.objects.select_related("profile").get(pk=self.user.pk).profile
+        with self.assertNumQueries(1):
+            self.assertEqual(profile.get_google_credentials()["scopes"], ["calendar"])
+            profile.get_google_credentials()
+
+    def test_missing_credentials(self):
+        self.assertIsNone(self.user.profile.get_google_credentials())
+
+    def test_convert_legacy_column(self):
+        other = User.objects.create_user(username="pat", email="pat@example.com", password="pw")
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE users_profile ADD COLUMN google_credentials text NULL")
+            cursor.execute(
+                "UPDATE users_profile SET google_credentials = %s WHERE id = %s",
+                ['{"token": "legacy"}', self.user.profile.pk],
+            )
+            cursor.execute(
+                "UPDATE users_profile SET google_credentials = %s WHERE id = %s",
+                ["not json", other.profile.pk],
+            )
+
+        out = StringIO()
+        call_command("convert_google_credentials", batch_size=1, stdout=out, stderr=StringIO())
+
+        self.assertIn("Converted 1 profiles (1 skipped)", out.getvalue())
+        self.assertEqual(GoogleCredentials.objects.get(profile=self.user.profile).data, {"token": "legacy"})
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT google_credentials FROM users_profile WHERE id = %s", [self.user.profile.pk])
+            self.assertIsNone(cursor.fetchone()[0])
+
+
+class SignupTests(TestCase):
+
+    def post(self, **overrides):
+        data = {
+            "username": "newdoc",
+            "email": "newdoc@example.com",
+            "role": "doctor",
+            "password1": "s3cret-pass",
+            "password2": "s3cret-pass",
+            **overrides,
+        }
+        return self.client.post(reverse("users:signup"), data)
+
+    def test_signup_creates_user_and_profile_in_one_transaction(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post()
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+
+        user = User.objects.get(username="newdoc")
+        self.assertEqual(user.profile.role, "doctor")
+        self.assertTrue(user.check_password("s3cret-pass"))
+
+        sql = [q["sql"] for q in ctx.captured_queries]
+        # The test case's own transaction turns atomic() into a savepoint.
+        begin = next(i for i, q in enumerate(sql) if q.startswith("SAVEPOINT"))
+        commit = next(i for i, q in enumerate(sql) if q.startswith("RELEASE SAVEPOINT"))
+        profile_writes = [i for i, q in enumerate(sql) if '"users_profile"' in q and not q.startswith("SELECT")]
+        self.assertEqual(len(profile_writes), 2)
+        self.assertTrue(all(begin < i < commit for i in profile_writes))
+
+    def test_duplicate_username_and_email(self):
+        User.objects.create_user(username="newdoc", email="other@example.com", password="pw")
+        User.objects.create_user(username="other", email="newdoc@example.com", password="pw")
+
+        with self.assertRaises(UsernameTaken):
+            create_account("newdoc", "fresh@example.com", "pw", "patient")
+        with self.assertRaises(EmailTaken):
+            create_account("fresh", "newdoc@example.com", "pw", "patient")
+        self.assertFalse(User.objects.filter(username="fresh").exists())
+
+        response = self.post()
+        self.assertRedirects(response, reverse("users:signup"), fetch_redirect_response=False)
+        self.assertEqual(User.objects.filter(username="newdoc").count(), 1)
+
+    def test_other_integrity_errors_are_not_reported_as_taken_usernames(self):
+        with mock.patch.object(User, "save", side_effect=IntegrityError("NOT NULL constraint failed")):
+            with self.assertRaises(IntegrityError):
+                create_account("fresh", "fresh@example.com", "pw", "patient")
+
+    def test_unknown_role_is_rejected(self):
+        response = self.post(role="admin")
+        self.assertRedirects(response, reverse("users:signup"), fetch_redirect_response=False)
+        self.assertFalse(User.objects.filter(username="newdoc").exists())
+
+
+class ImportUsersTests(TestCase):
+
+    def test_bulk_accounts_get_profiles_and_skip_duplicates(self):
+        User.objects.create_user(username="taken", email="taken@example.com", password="pw")
+        records = [
+            {"username": "doc1", "email": "doc1@example.com", "role": "doctor", "specialization": "cardiology"},
+            {"username": "pat1", "email": "pat1@example.com"},
+            {"username": "pat1", "email": "other@example.com"},
+            {"username": "taken", "email": "new@example.com"},
+            {"username": "pat2", "email": "taken@example.com"},
+            {"username": "x", "email": "x@example.com", "role": "admin"},
+        ]
+
+        with self.assertNumQueries(5):
+            created, skipped = bulk_create_accounts(records)
+
+        self.assertEqual((created, skipped), (2, 4))
+        doctor = User.objects.select_related("profile").get(username="doc1")
+        self.assertEqual((doctor.profile.role, doctor.profile.specialization), ("doctor", "cardiology"))
+        self.assertEqual(User.objects.get(username="pat1").profile.role, "patient")
+        self.assertFalse(doctor.has_usable_password())
+
+    def test_export_round_trip(self):
+        User.objects.create_user(username="pat", email="pat@example.com", password="pw")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "users.jsonl")
+            call_command("export_data", "users", output=path, stdout=StringIO())
+            User.objects.all().delete()
+
+            out = StringIO()
+            call_command("import_users", path, stdout=out)
+
+        self.assertIn("Imported 1 users", out.getvalue())
+        user = User.objects.get(username="pat")
+        self.assertTrue(user.check_password("pw"))
+        self.assertEqual(user.profile.role, "patient")
+
+
+class TunedHasherTests(TestCase):
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=None)
+    def test_defaults_to_djangos_iterations(self):
+        self.assertEqual(TunedPBKDF2PasswordHasher().iterations, PBKDF2PasswordHasher.iterations)
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_uses_the_configured_iterations(self):
+        encoded = TunedPBKDF2PasswordHasher().encode("pw", "salt")
+        self.assertEqual(encoded.split("$")[1], "1000")
+
+
+class SessionProfileTests(TestCase):
+
+    def setUp(self):
+        self.patient = User.objects.create_user(username="pat", email="pat@example.com", password="pw")
+        self.urls = [reverse("home"), reverse("appointments:doctors_list"), reverse("appointments:my_bookings")]
+
+    def session_queries(self, profile):
+        """Queries against the session table while logging in, browsing and logging out."""
+        phases = [
+            lambda: self.client.force_login(self.patient),
+            lambda: [self.client.get(url) for url in self.urls],
+            lambda: self.client.get(reverse("users:logout")),
+        ]
+        queries = []
+        with override_settings(**settings.SESSION_PROFILES[profile]):
+            for phase in phases:
+                with CaptureQueriesContext(connection) as ctx:
+                    phase()
+                queries.append([q["sql"] for q in ctx.captured_queries if '"django_session"' in q["sql"]])
+            # Flash messages travel in their own cookie.
+            self.assertTrue(self.client.cookies["messages"].value)
+        return queries
+
+    def test_cached_db_leaves_the_table_alone_between_login_and_logout(self):
+        login, browsing, logout = self.session_queries("cached_db")
+        self.assertTrue(login)
+        self.assertEqual(browsing, [])
+        self.assertTrue(logout)
+
+    def test_signed_cookies_never_touch_the_table(self):
+        self.assertEqual(self.session_queries("signed_cookies"), [[], [], []])
+
+    def test_unknown_profile_is_rejected(self):
+        with mock.patch.dict(os.environ, {"HMS_SESSION_PROFILE": "redis"}):
+            with self.assertRaisesMessage(ImproperlyConfigured, "default, cached_db, signed_cookies"):
+                runpy.run_path(str(settings.BASE_DIR / "hms" / "settings.py"))
@@ -1,10 +1,11 @@
 from django.shortcuts import render, redirect
-from django.contrib.auth.models import User
 from django.contrib.auth import login, authenticate, logout
 from django.contrib import messages
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 
+from .accounts import EmailTaken, UsernameTaken, create_account
+
 
 def signup(request):
     if request.method == "POST":
@@ -29,34 +30,19 @@ def signup(request):
             messages.error(request, "Invalid email format.")
             return redirect("users:signup")
 
-        if User.objects.filter(username=username).exists():
+        try:
+            user = create_account(username, email, password1, role)
+        except UsernameTaken:
             messages.error(request, "Username already exists.")
             return redirect("users:signup")
-
-        if User.objects.filter(email=email).exists():
+        except EmailTaken:
             messages.error(request, "Email already registered.")
             return redirect("users:signup")
-
-        try:
-            user = User.objects.create_user(
-                username=username,
-                email=email,
-                password=password1
-            )
-        except Exception as e:
-            messages.error(request, "Something went wrong. Please try again.")
+        except ValueError:
+            messages.error(request, "Please choose a valid role.")
             return redirect("users:signup")
 
-        try:
-            user.refresh_from_db()
-            user.profile.role = role
-            user.profile.save()
-        except Exception:
-            messages.error(request, "Error creating profile. Contact support.")
-            user.delete()  
-            return redirect("users:signup")
-
-        login(request, user)
+        login(request, user, backend="users.backends.ProfileBackend")
         messages.success(request, "Account created successfully!")
         return redirect("home")
 